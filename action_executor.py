@@ -3,138 +3,327 @@ action_executor.py
 -----------------
 Executes a sequence of timed actions with blending and timing logic, using mouse and keyboard controllers.
 """
+import asyncio
+import atexit
+import concurrent.futures
+import ctypes
+import ctypes.wintypes as wintypes
+import dataclasses
+import operator
+import queue
+import threading
 import time
 import random
-import logging
+import logging_setup
+import native_input
+import timing
+import mac_cgevent
+import win_sendinput
+from actions import to_actions
 from mouse_controller import MouseController
-from keyboard_controller import key_down, key_up, key_press
-from window_utils import get_window_rect
+from window_utils import get_window_rect, activate_window
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = logging_setup.get_logger(__name__)
 
 mouse_controller = MouseController()
 
-COMMON_KEYS = ['up', 'down', 'left', 'right', 'w', 'a', 's', 'd', 'enter', 'space', 'shift', 'ctrl', 'alt']
-MOUSE_BUTTONS = ['left', 'middle', 'right']
+KEY_EVENT_TYPES = ('key_down', 'key_up')
+BLENDED_KEY_TYPES = frozenset(('key_press', 'key_release', 'key_down', 'key_up'))
+BLEND_DELAY_MS = 150
+BLEND_THRESHOLD_MS = 300
+TIMING_ENTROPY = 0.03  # Max +/- fraction applied to the gap between consecutive actions
+THREAD_PRIORITY_TIME_CRITICAL = 15
+QOS_CLASS_USER_INTERACTIVE = 0x21
 
 def reset_all_inputs():
-    for key in COMMON_KEYS:
-        try:
-            key_up(key)
-        except Exception as e:
-            logger.debug(f"Error releasing key {key}: {e}")
-    import pyautogui
-    for button in MOUSE_BUTTONS:
-        try:
-            pyautogui.mouseUp(button=button)
-        except Exception as e:
-            logger.debug(f"Error releasing mouse button {button}: {e}")
-    logger.info("All inputs reset to prevent stuck keys/buttons")
-
-def _execute_single_action(action):
-    action_type = action.get('type')
-    left, top, _, _ = get_window_rect()
-    if action_type == 'key_press':
-        key = action.get('key')
-        duration = action.get('duration_ms')
-        if key:
-            key_press(key, duration)
-    elif action_type == 'key_down':
-        key = action.get('key')
-        if key:
-            key_down(key)
-    elif action_type == 'key_up':
-        key = action.get('key')
-        if key:
-            key_up(key)
-    elif action_type == 'mouse_move_direction':
-        direction = action.get('direction')
-        duration = action.get('duration_ms', 100)
-        mouse_controller.move(direction, duration)
-    elif action_type == 'mouse_click':
-        button = action.get('button', 'left')
-        duration = action.get('duration_ms', 100)
-        mouse_controller.click(duration, button)
-    elif action_type == 'mouse_double_click':
-        button = action.get('button', 'left')
-        duration = action.get('duration_ms', 100)
-        mouse_controller.double_click(duration, button)
-    elif action_type == 'mouse_move':
-        x, y = action.get('x'), action.get('y')
-        if x is not None and y is not None:
-            import pyautogui
-            pyautogui.moveTo(left + x, top + y)
-    elif action_type == 'mouse_press':
-        x, y = action.get('x'), action.get('y')
-        button = action.get('button', 'left')
-        duration = action.get('duration_ms', 100)
-        if x is not None and y is not None:
-            import pyautogui
-            pyautogui.mouseDown(x=left + x, y=top + y, button=button)
-            time.sleep(duration / 1000.0)
-            pyautogui.mouseUp(x=left + x, y=top + y, button=button)
-    # Add more action types as needed
+    """Release only the keys and mouse buttons that are still held down."""
+    released = native_input.releaseAll()
+    if released:
+        logger.debug("Released %d held inputs to prevent stuck keys/buttons", released)
 
-def execute_actions(actions):
-    BLEND_DELAY_MS = 150
-    BLEND_THRESHOLD_MS = 300
+DEFAULT_MOUSE_DURATION_MS = 100
+
+def key_down(key):
+    try:
+        native_input.keyDown(key)
+        logger.debug("KeyDown: %s", key)
+    except native_input.FailSafeException:
+        raise
+    except Exception as e:
+        logger.error("Error pressing key %s: %s", key, e)
+
+def key_up(key):
+    try:
+        native_input.keyUp(key)
+        logger.debug("KeyUp: %s", key)
+    except Exception as e:
+        logger.error("Error releasing key %s: %s", key, e)
+
+def key_press(key, duration_ms=None):
+    """Press the key, and release it after duration_ms if given (otherwise it stays held until the sequence resets)."""
+    key_down(key)
+    if duration_ms:
+        timing.sleep_ms(duration_ms)
+        key_up(key)
+
+def _do_key_press(action, left, top):
+    if action.key:
+        key_press(action.key, action.duration_ms)
+
+def _do_key_down(action, left, top):
+    if action.key:
+        key_down(action.key)
+
+def _do_key_up(action, left, top):
+    if action.key:
+        key_up(action.key)
+
+def _mouse_duration(action):
+    duration = action.duration_ms
+    return DEFAULT_MOUSE_DURATION_MS if duration is None else duration
+
+def _do_mouse_move_direction(action, left, top):
+    mouse_controller.move(action.direction, _mouse_duration(action))
+
+def _do_mouse_click(action, left, top):
+    mouse_controller.click(_mouse_duration(action), action.button)
+
+def _do_mouse_double_click(action, left, top):
+    mouse_controller.double_click(_mouse_duration(action), action.button)
+
+def _do_mouse_move(action, left, top):
+    x, y = action.x, action.y
+    if x is not None and y is not None:
+        native_input.moveTo(left + x, top + y)
+
+def _do_mouse_press(action, left, top):
+    x, y = action.x, action.y
+    if x is not None and y is not None:
+        button = action.button
+        native_input.mouseDown(x=left + x, y=top + y, button=button)
+        timing.sleep_ms(_mouse_duration(action))
+        native_input.mouseUp(x=left + x, y=top + y, button=button)
+
+def _do_unknown(action, left, top):
+    logger.debug("Ignoring unsupported action type: %s", action.type)
+
+# Add more action types as needed
+_HANDLERS = {
+    'key_press': _do_key_press,
+    'key_down': _do_key_down,
+    'key_up': _do_key_up,
+    'mouse_move_direction': _do_mouse_move_direction,
+    'mouse_click': _do_mouse_click,
+    'mouse_double_click': _do_mouse_double_click,
+    'mouse_move': _do_mouse_move,
+    'mouse_press': _do_mouse_press,
+}
+
+def _execute_single_action(action, window_origin=(0, 0)):
+    left, top = window_origin
+    _HANDLERS.get(action.type, _do_unknown)(action, left, top)
+
+def _do_key_batch(actions, left, top):
+    """Execute simultaneous key_down/key_up actions, as one SendInput call where possible."""
+    native_input.keyEvents([(a.key, a.type == 'key_up') for a in actions])
+
+def _group_simultaneous_key_events(actions):
+    """Group runs of key_down/key_up actions that share a time offset so they can be sent together."""
+    groups = []
+    for action in actions:
+        if groups and action.type in KEY_EVENT_TYPES and action.key:
+            previous = groups[-1][-1]
+            if previous.type in KEY_EVENT_TYPES and previous.key and previous.time_offset_ms == action.time_offset_ms:
+                groups[-1].append(action)
+                continue
+        groups.append([action])
+    return groups
+
+def _blend_actions(actions, last_key_time=None):
+    """Push back key actions that repeat a key within BLEND_THRESHOLD_MS by BLEND_DELAY_MS, in one pass.
+    Pass the same last_key_time dict across calls to blend a sequence that arrives in pieces."""
     blended_actions = []
-    last_key_action = {}
-    for i, action in enumerate(actions):
-        action_type = action.get('type')
-        key = action.get('key')
-        t = action.get('time_offset_ms', 0)
-        if action_type in ('key_press', 'key_release', 'key_down', 'key_up') and key:
-            last = last_key_action.get(key)
-            if last:
-                last_time, last_type = last
-                if t - last_time < BLEND_THRESHOLD_MS:
-                    blended_actions.append({
-                        'type': 'sleep',
-                        'duration_ms': BLEND_DELAY_MS,
-                        'time_offset_ms': t
-                    })
-                    t += BLEND_DELAY_MS
-                    action = dict(action)
-                    action['time_offset_ms'] = t
-            last_key_action[key] = (t, action_type)
+    if last_key_time is None:
+        last_key_time = {}
+    for action in actions:
+        key = action.key
+        if key and action.type in BLENDED_KEY_TYPES:
+            t = action.time_offset_ms
+            last_time = last_key_time.get(key)
+            if last_time is not None and t - last_time < BLEND_THRESHOLD_MS:
+                t += BLEND_DELAY_MS
+                action = dataclasses.replace(action, time_offset_ms=t)
+            last_key_time[key] = t
         blended_actions.append(action)
-    actions = blended_actions
+    return blended_actions
+
+_BY_OFFSET = operator.attrgetter('time_offset_ms')
+
+def _sort_by_offset(actions):
+    """Stable-sort actions by start offset in place, skipping the sort when they are already in order (the usual case)."""
+    offsets = [a.time_offset_ms for a in actions]
+    if any(later < earlier for earlier, later in zip(offsets, offsets[1:])):
+        actions.sort(key=_BY_OFFSET)
+    return actions
+
+def _build_schedule(actions):
+    """Order actions by start offset (stable, so ties keep their LLM order) and apply key blending."""
+    schedule = _blend_actions(_sort_by_offset(actions))
+    # Blending only delays actions, which can move them past later ones
+    return _sort_by_offset(schedule)
+
+def _focus_target_window():
+    """Bring the game window to the front and return its (left, top) origin."""
+    activate_window()
+    return get_window_rect()[:2]
+
+def _jittered_delay(target_offset_ms, previous):
+    """Return the start delay in seconds for an action, jittering only the gap since the previous one.
+    previous is a [offset_ms, delay_seconds] pair for the last scheduled action and is updated in place,
+    so short gaps (modifier + key, brief holds) stay short however late in the sequence they fall."""
+    gap_ms = target_offset_ms - previous[0]
+    delay = previous[1] + gap_ms * (1 + random.uniform(-TIMING_ENTROPY, TIMING_ENTROPY)) / 1000.0
+    previous[0], previous[1] = target_offset_ms, delay
+    return delay
+
+def _compile_schedule(groups):
+    """Flatten grouped actions into (delay_seconds, handler, payload) tuples, with jitter and handler lookup done up front."""
+    compiled = []
+    previous = [0, 0.0]
+    for group in groups:
+        action = group[0]
+        target_offset_ms = action.time_offset_ms
+        if target_offset_ms > 2000:
+            logger.warning("Action offset %sms exceeds 2000ms limit. Skipping: %s", target_offset_ms, action)
+            continue
+        delay = _jittered_delay(target_offset_ms, previous)
+        if len(group) > 1:
+            compiled.append((delay, _do_key_batch, group))
+        else:
+            compiled.append((delay, _HANDLERS.get(action.type, _do_unknown), action))
+    return compiled
+
+def _run_schedule(actions):
+    """Execute a complete action sequence on the calling thread."""
+    actions = _build_schedule(to_actions(actions))
+    compiled = _compile_schedule(_group_simultaneous_key_events(actions))
+    # The window won't move within a 2s sequence, so activate it and read its origin once before timing starts
+    left, top = _focus_target_window()
+    # Every action is scheduled against the same start time, so sleep error doesn't accumulate
     start_time = time.monotonic()
-    current_offset_ms = 0
-    logger.debug(f"Starting timed action sequence ({len(actions)} actions)...")
+    logger.debug("Starting timed action sequence (%d actions)...", len(actions))
+    try:
+        for delay, handler, payload in compiled:
+            deadline = start_time + delay
+            if deadline < time.monotonic():
+                logger.debug("Action is %.1fms late. Executing immediately. Action: %s", (time.monotonic() - deadline) * 1000, payload)
+            else:
+                timing.sleep_until(deadline)
+            if _stopping.is_set():
+                break
+            handler(payload, left, top)
+    finally:
+        reset_all_inputs()
+    end_time = time.monotonic()
+    total_duration = (end_time - start_time) * 1000
+    logger.info("Finished action sequence (%d actions) in %.2fms.", len(actions), total_duration)
+
+def _run_stream(actions):
+    """Execute actions from a blocking iterator as they arrive, timing them from the first one. Returns the count run."""
+    last_key_time = {}
+    previous = [0, 0.0]
+    start_time = None
+    window_origin = (0, 0)
+    executed = 0
     try:
         for action in actions:
-            target_offset_ms = action.get('time_offset_ms', 0)
+            [action] = _blend_actions(to_actions([action]), last_key_time)
+            if start_time is None:
+                window_origin = _focus_target_window()
+                start_time = time.monotonic()
+            target_offset_ms = action.time_offset_ms
             if target_offset_ms > 2000:
-                logger.warning(f"Action offset {target_offset_ms}ms exceeds 2000ms limit. Skipping: {action}")
-                continue
-            delay_ms = target_offset_ms - current_offset_ms
-            if delay_ms > 0:
-                entropy = random.uniform(-0.03, 0.03)
-                delay_ms = int(delay_ms * (1 + entropy))
-                time.sleep(delay_ms / 1000.0)
-                current_offset_ms = target_offset_ms
-            elif delay_ms < 0:
-                logger.warning(f"Negative delay calculated ({delay_ms}ms). Executing immediately. Action: {action}")
-                current_offset_ms = target_offset_ms
-            if action.get('type') == 'sleep':
-                duration = action.get('duration_ms', 0)
-                if duration > 0:
-                    entropy = random.uniform(-0.03, 0.03)
-                    duration = int(duration * (1 + entropy))
-                    logger.debug(f"Blending delay: sleeping {duration}ms to smooth repeated key actions.")
-                    time.sleep(duration / 1000.0)
-                    current_offset_ms += duration
+                logger.warning("Action offset %sms exceeds 2000ms limit. Skipping: %s", target_offset_ms, action)
                 continue
-            _execute_single_action(action)
-            if ('duration_ms' in action and action['type'] in ['key_press', 'mouse_press']):
-                entropy = random.uniform(-0.03, 0.03)
-                adj_duration = int(action['duration_ms'] * (1 + entropy))
-                current_offset_ms += adj_duration
+            deadline = start_time + _jittered_delay(target_offset_ms, previous)
+            if deadline < time.monotonic():
+                logger.debug("Streamed action is %.1fms late. Executing immediately. Action: %s", (time.monotonic() - deadline) * 1000, action)
+            else:
+                timing.sleep_until(deadline)
+            if _stopping.is_set():
+                break
+            _execute_single_action(action, window_origin)
+            executed += 1
     finally:
+        if start_time is not None:
+            reset_all_inputs()
+    if start_time is not None:
+        logger.info("Finished streamed action sequence (%d actions) in %.2fms.", executed, (time.monotonic() - start_time) * 1000)
+    return executed
+
+def _raise_thread_priority():
+    """Ask the OS to schedule the calling thread ahead of normal work so input timing isn't starved."""
+    try:
+        if win_sendinput.IS_WINDOWS:
+            kernel32 = ctypes.windll.kernel32
+            kernel32.GetCurrentThread.restype = wintypes.HANDLE
+            kernel32.SetThreadPriority.argtypes = [wintypes.HANDLE, ctypes.c_int]
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_PRIORITY_TIME_CRITICAL)
+        elif mac_cgevent.IS_MACOS:
+            libsystem = ctypes.CDLL("/usr/lib/libSystem.dylib")
+            libsystem.pthread_set_qos_class_self_np(QOS_CLASS_USER_INTERACTIVE, 0)
+    except Exception as e:
+        logger.debug("Could not raise action dispatcher priority: %s", e)
+
+_dispatch_queue = queue.Queue()  # (run, actions, future) jobs, executed one at a time in order
+_stopping = threading.Event()  # Set at interpreter exit so the dispatcher stops sending new input
+
+def _dispatcher_loop():
+    _raise_thread_priority()
+    while True:
+        run, actions, future = _dispatch_queue.get()
+        if not future.set_running_or_notify_cancel():
+            continue
+        try:
+            future.set_result(run(actions))
+        except Exception as e:
+            future.set_exception(e)
+
+threading.Thread(target=_dispatcher_loop, name="action-dispatcher", daemon=True).start()
+
+def _release_inputs_at_exit():
+    """The dispatcher is a daemon thread and dies mid-sequence on exit (e.g. Ctrl+C), skipping its own reset,
+    so stop it from sending more input and release whatever it left held down."""
+    _stopping.set()
+    try:
         reset_all_inputs()
-    end_time = time.monotonic()
-    total_duration = (end_time - start_time) * 1000
-    logger.debug(f"Finished action sequence in {total_duration:.2f}ms.")
+    except Exception as e:
+        logger.error("Error releasing inputs at exit: %s", e)
+
+atexit.register(_release_inputs_at_exit)
+
+def submit_actions(actions):
+    """Queue an action sequence on the dispatcher thread and return a concurrent.futures.Future for its completion."""
+    future = concurrent.futures.Future()
+    _dispatch_queue.put((_run_schedule, actions, future))
+    return future
+
+def submit_action_stream(actions):
+    """Queue a blocking iterator of actions on the dispatcher thread. The Future's result is the number executed."""
+    future = concurrent.futures.Future()
+    _dispatch_queue.put((_run_stream, actions, future))
+    return future
+
+async def execute_actions_async(actions):
+    await asyncio.wrap_future(submit_actions(actions))
+
+def execute_actions(actions):
+    """Execute actions on the dispatcher thread and block until they finish."""
+    submit_actions(actions).result()
+
+async def execute_action_stream_async(actions):
+    return await asyncio.wrap_future(submit_action_stream(actions))
+
+def execute_action_stream(actions):
+    """Execute actions from a blocking iterator as they arrive. Returns the number of actions executed."""
+    return submit_action_stream(actions).result()
@@ -0,0 +1,43 @@
+"""
+actions.py
+----------
+Defines the Action record that timed input actions are converted into once, before execution.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+# Key names the LLM sometimes emits, mapped to their canonical key once at parse time
+KEY_ALIASES = {'\n': 'enter', '\r': 'enter', '\t': 'tab'}
+
+@dataclass(slots=True)
+class Action:
+    type: Optional[str]
+    key: Optional[str] = None
+    duration_ms: Optional[int] = None
+    time_offset_ms: int = 0
+    x: Optional[int] = None
+    y: Optional[int] = None
+    button: str = 'left'
+    direction: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, action):
+        """Build an Action from an LLM action dict with flat fields or a nested 'parameters' dict (Gemini schema)."""
+        parameters = action.get('parameters')
+        if isinstance(parameters, dict):
+            action = {**action, **parameters}
+        key = action.get('key')
+        return cls(
+            type=action.get('type'),
+            key=KEY_ALIASES.get(key, key),
+            duration_ms=action.get('duration_ms'),
+            time_offset_ms=action.get('time_offset_ms') or 0,
+            x=action.get('x'),
+            y=action.get('y'),
+            button=action.get('button') or 'left',
+            direction=action.get('direction')
+        )
+
+def to_actions(actions):
+    """Convert a list of action dicts (or Actions) into Actions."""
+    return [a if isinstance(a, Action) else Action.from_dict(a) for a in actions]
@@ -1,8 +1,9 @@
 """
 config.py
 ---------
-Central configuration for the automation agent. Stores game title, manual path, and ensures required folders exist for logs and tools.
+Central configuration for the automation agent. Stores game title, manual path, and creates required folders for logs and tools on first use.
 """
+import functools
 import os
 
 # Game configuration
@@ -18,6 +19,11 @@ RUN_SUMMARIES_DIR = os.path.join(MANUALS_DIR, "run_summaries")
 RUN_LOGS_DIR = os.path.join("logs", "runs")
 TOOLS_DIR = "tools"
 
-# Ensure required directories exist
-for folder in [MANUALS_DIR, RUN_SUMMARIES_DIR, RUN_LOGS_DIR, TOOLS_DIR]:
-    os.makedirs(folder, exist_ok=True)
+# LLM responses reused for visually unchanged screens, kept across runs
+RESPONSE_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".operator_cache", "responses.pkl")
+
+@functools.lru_cache(maxsize=None)
+def ensure_dirs():
+    """Create the required directories. Runs once per process, on first call rather than at import."""
+    for folder in [MANUALS_DIR, RUN_SUMMARIES_DIR, RUN_LOGS_DIR, TOOLS_DIR]:
+        os.makedirs(folder, exist_ok=True)
@@ -4,16 +4,24 @@ google_llm_client.py
 This module provides the interface for sending screenshots and context to Google's Gemini LLM API.
 It handles image loading, prompt construction, schema definition, and robust error handling for API and parsing issues.
 """
+import asyncio
 import os
 import base64
+import functools
+import io
 import json
+import string
+import fastjsonschema
 from PIL import Image
 from google import genai
 from google.genai import types
-import logging
+from actions import Action
+import logging_setup
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = logging_setup.get_logger(__name__)
+
+MODEL_NAME = 'gemini-2.5-pro-preview-03-25'
+UPLOAD_JPEG_QUALITY = 85
 
 # Define the JSON schema for the expected response
 RESPONSE_SCHEMA = {
@@ -63,51 +71,21 @@ RESPONSE_SCHEMA = {
     "propertyOrdering": ["narrative", "plan", "actions", "analysis", "pinned_screenshot"]
 }
 
-def send_screenshot_to_llm(image_paths, state=None, analysis=None, plan=None, screen_resolution=None, history=None, memory=None, pinned_screenshot=None, latest_journal=None) -> dict:
-    """Send multiple screenshots and context to Google's Gemini LLM and return the response as a dict."""
-    # Retrieve and validate API key
-    api_key = os.getenv("GOOGLE_API_KEY")  # Ensure this matches your environment variable name
-    if not api_key:
-        logger.error("GOOGLE_API_KEY environment variable not set.")
-        raise RuntimeError("GOOGLE_API_KEY environment variable not set.")
-
-    # Initialize the Google GenAI client
-    client = genai.Client(api_key=api_key)
-    model_name = 'gemini-2.5-pro-preview-03-25'
-
-    # Accept image_paths as a list
-    if isinstance(image_paths, str):
-        image_paths = [image_paths]
-    # Always include pinned screenshot if not already in the list
-    if pinned_screenshot and pinned_screenshot not in image_paths:
-        image_paths = [pinned_screenshot] + image_paths
-    # Only keep the last 3 (plus pinned)
-    image_paths = image_paths[-3:] if len(image_paths) > 3 else image_paths
-
-    # Prepare image data as PIL Image objects for the new SDK
-    image_parts = []
-    valid_image_paths = []
-    for path in image_paths:
-        if not os.path.exists(path):
-            logger.warning(f"Screenshot not found: {path}")
-            continue
-        try:
-            img = Image.open(path)
-            image_parts.append(img)
-            valid_image_paths.append(path)
-        except Exception as e:
-            logger.error(f"Failed to process screenshot {path}: {e}")
+# Compiled once into a specialized validator for a single action object
+_ACTION_VALIDATOR = fastjsonschema.compile(RESPONSE_SCHEMA["properties"]["actions"]["items"])
 
-    # Auto-detect screen resolution from the most recent valid screenshot if not provided
-    if screen_resolution is None and valid_image_paths:
-        try:
-            with Image.open(valid_image_paths[-1]) as img:
-                screen_resolution = {'width': img.width, 'height': img.height}
-        except Exception as e:
-            logger.warning(f"Failed to determine screen resolution: {e}")
+def validate_action(action):
+    """Return True if the action matches the action schema in RESPONSE_SCHEMA."""
+    try:
+        _ACTION_VALIDATOR(action)
+        return True
+    except fastjsonschema.JsonSchemaException as e:
+        logger.debug(f"Dropping invalid action {action}: {e}")
+        return False
 
-    # Define the context prompt (CoQ controls summary added and refined)
-    context = """
+# Context prompt (CoQ controls summary added and refined). string.Template is used
+# because the mouse action examples contain literal JSON braces.
+_PROMPT_TEMPLATE = string.Template("""
 You are an automation agent controlling the game \"CoQ\" (Caves of Qud) in an OODA loop (Observe, Orient, Decide, Act).
 
 Most relevant controls:
@@ -138,13 +116,80 @@ Analyze the screenshots and context, then return a JSON object with these keys:
 # Do not use absolute pixel coordinates for mouse actions unless explicitly required for legacy compatibility.
 # --- END: WASD-style mouse control instructions ---
 
-Screen resolution: {screen_resolution}
-Previous state: {state}
-Previous analysis: {analysis}
-Previous plan: {plan}
-Recent history (last 5): {history}
-Memory notes: {memory}
-""".format(
+Screen resolution: $screen_resolution
+Previous state: $state
+Previous analysis: $analysis
+Previous plan: $plan
+Recent history (last 5): $history
+Memory notes: $memory
+""")
+
+# Built once; the SDK converts the schema dict when the config is constructed
+_GENERATION_CONFIG = types.GenerateContentConfig(
+    response_schema=RESPONSE_SCHEMA,
+    response_mime_type="application/json"
+)
+
+@functools.lru_cache(maxsize=1)
+def _get_client(api_key):
+    """Return a process-wide Google GenAI client for the API key, created on first use."""
+    return genai.Client(api_key=api_key)
+
+@functools.lru_cache(maxsize=8)
+def _load_image_part(path, mtime_ns):
+    """Read a screenshot once and return its JPEG API part and (width, height). Keyed by mtime so rewritten files reload."""
+    with open(path, "rb") as img_file:
+        img_bytes = img_file.read()
+    with Image.open(io.BytesIO(img_bytes)) as img:
+        size = img.size
+        if img.format != "JPEG":
+            # Game screenshots are several times smaller as JPEG than PNG, which shortens the upload
+            buffer = io.BytesIO()
+            img.convert("RGB").save(buffer, format="JPEG", quality=UPLOAD_JPEG_QUALITY)
+            img_bytes = buffer.getvalue()
+    return types.Part.from_bytes(data=img_bytes, mime_type="image/jpeg"), size
+
+def _prepare_request(image_paths, state, analysis, plan, screen_resolution, history, memory, pinned_screenshot, latest_journal):
+    """Build the client and request contents shared by the sync and async entry points."""
+    # Retrieve and validate API key
+    api_key = os.getenv("GOOGLE_API_KEY")  # Ensure this matches your environment variable name
+    if not api_key:
+        logger.error("GOOGLE_API_KEY environment variable not set.")
+        raise RuntimeError("GOOGLE_API_KEY environment variable not set.")
+
+    # Reuse the shared client so its HTTP connections stay open between calls
+    client = _get_client(api_key)
+
+    # Accept image_paths as a list
+    if isinstance(image_paths, str):
+        image_paths = [image_paths]
+    # Always include pinned screenshot if not already in the list
+    if pinned_screenshot and pinned_screenshot not in image_paths:
+        image_paths = [pinned_screenshot] + image_paths
+    # Only keep the last 3 (plus pinned)
+    image_paths = image_paths[-3:] if len(image_paths) > 3 else image_paths
+
+    # Screenshots are re-sent across consecutive calls, so reuse the already-loaded parts
+    image_parts = []
+    last_image_size = None
+    for path in image_paths:
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            logger.warning(f"Screenshot not found: {path}")
+            continue
+        try:
+            image_part, last_image_size = _load_image_part(path, mtime_ns)
+            image_parts.append(image_part)
+        except Exception as e:
+            logger.error(f"Failed to process screenshot {path}: {e}")
+
+    # Auto-detect screen resolution from the most recent valid screenshot if not provided
+    if screen_resolution is None and last_image_size:
+        screen_resolution = {'width': last_image_size[0], 'height': last_image_size[1]}
+
+    # Fill in the context prompt
+    context = _PROMPT_TEMPLATE.substitute(
         screen_resolution=json.dumps(screen_resolution),
         state=json.dumps(state),
         analysis=json.dumps(analysis),
@@ -158,54 +203,28 @@ Memory notes: {memory}
 
     # Combine text prompt and images into content for the API
     contents = [prompt] + image_parts
+    return client, contents
 
-    # Send request to Google's Gemini API using the new SDK
+def _parse_response(content_text) -> dict:
+    """Parse the Gemini response text into the OODA response dict, converting valid actions to Action records."""
     try:
-        # Create config for the API call
-        generation_config = {
-            'response_schema': RESPONSE_SCHEMA,
-            'response_mime_type': "application/json"
-        }
-        
-        # Call generate_content with the client
-        response = client.models.generate_content(
-            model=model_name,
-            contents=contents,
-            config=generation_config
-        )
-        content_text = response.text  # Extract the response text
-    except Exception as e:
-        logger.error(f"Failed to get response from Gemini API: {e}")
-        return {"narrative": "", "plan": "", "actions": [], "analysis": "Error contacting Google API."}
-
-    # Filter and validate actions in the response
-    def validate_action(action):
-        required_keys = {"type", "parameters", "time_offset_ms"}
-        if not isinstance(action, dict):
-            return False
-        if not required_keys.issubset(action.keys()):
-            return False
-        if not isinstance(action["parameters"], dict):
-            return False
-        return True
-
-    # Parse the response into a JSON object
-    try:
-        # Find the start and end of the JSON object within the response text
-        start_index = content_text.find("{")
-        end_index = content_text.rfind("}")
-
-        if start_index != -1 and end_index != -1 and end_index > start_index:
+        try:
+            # response_mime_type="application/json" means the text is normally the bare JSON document
+            ooda_response = json.loads(content_text)
+        except json.JSONDecodeError:
+            # Fall back to the outermost {...} in case the model wrapped the JSON in extra text
+            start_index = content_text.find("{")
+            end_index = content_text.rfind("}")
+            if start_index == -1 or end_index == -1 or end_index <= start_index:
+                logger.error(f"Could not find JSON object in LLM response.")
+                logger.debug(f"Raw response content: {content_text}")
+                return {"narrative": "", "plan": "", "actions": [], "analysis": "Error parsing LLM response: JSON object not found."}
             json_string = content_text[start_index : end_index + 1]
             ooda_response = json.loads(json_string)
 
-            # Validate actions if present
-            if "actions" in ooda_response and isinstance(ooda_response["actions"], list):
-                ooda_response["actions"] = [action for action in ooda_response["actions"] if validate_action(action)]
-        else:
-            logger.error(f"Could not find JSON object in LLM response.")
-            logger.debug(f"Raw response content: {content_text}")
-            ooda_response = {"narrative": "", "plan": "", "actions": [], "analysis": "Error parsing LLM response: JSON object not found."}
+        # Validate actions if present
+        if "actions" in ooda_response and isinstance(ooda_response["actions"], list):
+            ooda_response["actions"] = [Action.from_dict(action) for action in ooda_response["actions"] if validate_action(action)]
 
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse LLM JSON response (JSONDecodeError): {e}")
@@ -218,3 +237,36 @@ Memory notes: {memory}
         ooda_response = {"narrative": "", "plan": "", "actions": [], "analysis": "Error parsing LLM response."}
 
     return ooda_response
+
+def send_screenshot_to_llm(image_paths, state=None, analysis=None, plan=None, screen_resolution=None, history=None, memory=None, pinned_screenshot=None, latest_journal=None) -> dict:
+    """Send multiple screenshots and context to Google's Gemini LLM and return the response as a dict."""
+    client, contents = _prepare_request(image_paths, state, analysis, plan, screen_resolution, history, memory, pinned_screenshot, latest_journal)
+    try:
+        response = client.models.generate_content(
+            model=MODEL_NAME,
+            contents=contents,
+            config=_GENERATION_CONFIG
+        )
+        content_text = response.text  # Extract the response text
+    except Exception as e:
+        logger.error(f"Failed to get response from Gemini API: {e}")
+        return {"narrative": "", "plan": "", "actions": [], "analysis": "Error contacting Google API."}
+    return _parse_response(content_text)
+
+async def send_screenshot_to_llm_async(image_paths, state=None, analysis=None, plan=None, screen_resolution=None, history=None, memory=None, pinned_screenshot=None, latest_journal=None) -> dict:
+    """Async variant of send_screenshot_to_llm; awaits the Gemini round-trip so the caller can overlap other work."""
+    # Reading and re-encoding screenshots blocks, so it runs on a worker thread rather than the event loop
+    client, contents = await asyncio.to_thread(
+        _prepare_request, image_paths, state, analysis, plan, screen_resolution, history, memory, pinned_screenshot, latest_journal
+    )
+    try:
+        response = await client.aio.models.generate_content(
+            model=MODEL_NAME,
+            contents=contents,
+            config=_GENERATION_CONFIG
+        )
+        content_text = response.text  # Extract the response text
+    except Exception as e:
+        logger.error(f"Failed to get response from Gemini API: {e}")
+        return {"narrative": "", "plan": "", "actions": [], "analysis": "Error contacting Google API."}
+    return _parse_response(content_text)
@@ -2,20 +2,28 @@
 input_controller.py
 ------------------
 Main interface for executing keyboard and mouse actions on the target window.
-Delegates to action_executor, mouse_controller, keyboard_controller, and window_utils modules.
+Delegates to action_executor, mouse_controller, and window_utils modules.
 """
-from action_executor import execute_actions, reset_all_inputs
+from action_executor import execute_actions, execute_actions_async, execute_action_stream, execute_action_stream_async, submit_actions, submit_action_stream, reset_all_inputs
+from action_executor import key_down, key_up, key_press
+from native_input import FailSafeException
 from mouse_controller import MouseController
-from keyboard_controller import key_down, key_up, key_press
-from window_utils import get_window_rect
+from window_utils import get_window_rect, activate_window
 
 # Expose main interface
 __all__ = [
     "execute_actions",
+    "execute_actions_async",
+    "execute_action_stream",
+    "execute_action_stream_async",
+    "submit_actions",
+    "submit_action_stream",
     "reset_all_inputs",
     "MouseController",
     "key_down",
     "key_up",
     "key_press",
-    "get_window_rect"
+    "get_window_rect",
+    "activate_window",
+    "FailSafeException"
 ]
\ No newline at end of file
@@ -4,22 +4,252 @@ llm_client.py
 This module provides the interface for sending screenshots and context to the OpenRouter LLM API.
 It handles image encoding, prompt construction, schema definition, and robust error handling for network and parsing issues.
 """
+import asyncio
 import os
 import base64
+import functools
+import io
 import json
+import random
+import struct
 import requests
 import time
-import logging
-from requests.exceptions import ConnectionError, ChunkedEncodingError
+import logging_setup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from requests.exceptions import ChunkedEncodingError
 import urllib3
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import config
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = logging_setup.get_logger(__name__)
 
-def send_screenshot_to_llm(image_paths, state=None, analysis=None, plan=None, screen_resolution=None, history=None, memory=None, pinned_screenshot=None, latest_journal=None) -> dict:
-    """Send multiple screenshots and context to OpenRouter LLM and return the response as a dict."""
+# Screenshots are re-encoded before upload to cut request size and vision-token cost
+MAX_IMAGE_SIDE = 1280
+JPEG_QUALITY = 80
+
+# File reads and JPEG encoding release the GIL, so screenshots are prepared concurrently
+_ENCODE_POOL = ThreadPoolExecutor(max_workers=4)
+
+# Connection failures, rate limits and gateway errors are retried inside urllib3 with short exponential
+# backoff, honouring Retry-After on 429/503. Read timeouts are not retried: the request may already be
+# generating (and billing) a completion, and each retry could wait out the full read timeout again.
+_RETRY = Retry(
+    total=5,
+    read=0,
+    backoff_factor=0.3,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=frozenset(["POST"]),
+    respect_retry_after_header=True,
+    raise_on_status=False
+)
+REQUEST_TIMEOUT = (3, 20)  # (connect, read) seconds, so a stuck handshake can't wedge the loop
+
+# One live LLM request at a time; overlapping calls would only compete for the same rate limit
+_LLM_SLOT = asyncio.Semaphore(1)
+
+# One pooled session keeps the TLS connection to OpenRouter alive between OODA iterations
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=_RETRY))
+
+# Generic, tool-agnostic context for the LLM; the per-call state is appended after it
+_PROMPT_PREAMBLE = """
+You are an automation agent operating in a perception-action loop. Your job is to observe the environment, analyze the situation, plan, and act. You receive screenshots and context, and you must:
+- Provide a brief narrative of your intent and reasoning.
+- Propose a concise, step-by-step plan.
+- Output a list of timed actions to execute within the next 2 seconds (2000ms). Each action should specify type, parameters, and a start time offset in milliseconds.
+- Analyze the outcome after acting and describe the new state.
+
+You have access to a 'remember' tool. Use it to record important facts, discoveries, or strategies that should be retained for future context. When you want to remember something, add an entry to the journal with the key 'remember' and a short description of the fact or insight. These will be included in your system prompt as memory notes.
+
+Always use your journal to record relevant information, especially when you learn something new, encounter a novel situation, or need to track long-term goals or facts.
+
+You are provided with up to 5 prior screenshots (plus a pinned screenshot if present), recent plans, analyses, and memory notes from your journal.
+"""
+# --- BEGIN: WASD-style mouse control instructions ---
+# For mouse actions, use these types:
+# - mouse_move_direction: Move the mouse in a direction ('w', 'a', 's', 'd', 'up', 'down', 'left', 'right') for a specified duration (ms). Example:
+#   {"type": "mouse_move_direction", "direction": "d", "duration_ms": 200, "time_offset_ms": 0}
+# - mouse_click: Click at the current mouse position for a specified duration (ms). Example:
+#   {"type": "mouse_click", "button": "left", "duration_ms": 100, "time_offset_ms": 100}
+# - mouse_double_click: Double-click at the current mouse position for a specified duration (ms) per click. Example:
+#   {"type": "mouse_double_click", "button": "left", "duration_ms": 100, "time_offset_ms": 200}
+# Do not use absolute pixel coordinates for mouse actions unless explicitly required for legacy compatibility.
+# --- END: WASD-style mouse control instructions ---
+_PROMPT_SUFFIX = "\nRespond only with the JSON object as described above."
+_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "narrative": {"type": "string", "description": "Narrative plan for this loop."},
+        "plan": {"type": "string", "description": "Step-by-step plan for this loop."},
+        "actions": {
+            "type": "array",
+            "description": "Timed actions to execute within 2000ms.",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "type": {
+                        "type": "string",
+                        "enum": ["key_press", "key_release", "mouse_move", "mouse_press", "mouse_release", "mouse_drag", "mouse_move_direction", "mouse_click", "mouse_double_click"],
+                        "description": "The type of input action."
+                    },
+                    "direction": {"type": "string", "description": "Direction for mouse_move_direction (w/a/s/d/up/down/left/right)."},
+                    "duration_ms": {"type": "integer", "description": "Duration in milliseconds for the action."},
+                    "button": {"type": "string", "enum": ["left", "right", "middle"], "description": "Mouse button for click actions."},
+                    "time_offset_ms": {"type": "integer", "description": "Start time in milliseconds relative to the beginning of the action sequence (0-2000)."},
+                    "key": {"type": "string", "description": "Key identifier (e.g., 'w', 'a', 'enter', 'shift'). Required for key actions."},
+                    "x": {"type": "integer", "description": "X coordinate. Required for mouse actions."},
+                    "y": {"type": "integer", "description": "Y coordinate. Required for mouse actions."},
+                    "duration_ms": {
+                        "type": "integer",
+                        "description": "Duration for holding a key or mouse button (used with key_press or mouse_press if release is not separate)."
+                    }
+                },
+                "required": ["type", "key", "x", "y", "button", "time_offset_ms", "duration_ms", "direction"],
+                "additionalProperties": False
+            }
+        },
+        "analysis": {"type": "string", "description": "Analysis of the outcome and current state."},
+        "pinned_screenshot": {"type": ["string", "integer"], "description": "Filename or index of screenshot to pin.", "nullable": True}
+    },
+    "required": ["narrative", "plan", "actions", "analysis", "pinned_screenshot"],
+    "additionalProperties": False
+}
+
+@functools.lru_cache(maxsize=16)
+def _encode_image(path, mtime_ns):
+    """Return (JPEG data URL, original (width, height)) for a screenshot. Keyed by mtime so rewritten files are re-encoded."""
+    with Image.open(path) as img:
+        size = img.size
+        # Screenshots already saved as small JPEGs are uploaded as-is rather than decoded and re-encoded
+        if img.format == "JPEG" and max(size) <= MAX_IMAGE_SIDE:
+            with open(path, "rb") as f:
+                img_b64 = base64.b64encode(f.read()).decode("ascii")
+            return f"data:image/jpeg;base64,{img_b64}", size
+        img = img.convert("RGB")
+        img.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=JPEG_QUALITY)
+    img_b64 = base64.b64encode(buffer.getvalue()).decode("ascii")
+    return f"data:image/jpeg;base64,{img_b64}", size
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def _read_png_size(path):
+    """Return (width, height) from a PNG's IHDR chunk without decoding the image, or None if it isn't a PNG."""
+    with open(path, "rb") as f:
+        header = f.read(24)
+    if len(header) < 24 or not header.startswith(PNG_SIGNATURE) or header[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", header[16:24])
+
+def _load_screenshot(path):
+    """Encode one screenshot for upload, returning None (and logging) if it can't be read."""
+    try:
+        return _encode_image(path, os.stat(path).st_mtime_ns)
+    except Exception as e:
+        logger.warning(f"Failed to process screenshot {path}: {e}")
+        return None
+
+class _ActionStreamParser:
+    """Scans streamed JSON text and returns each element of the top-level "actions" array as soon as it is complete."""
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None  # Most recent string at the top level, i.e. the key of the next value
+        self._in_actions = False
+        self._item_start = None
+
+    def feed(self, chunk):
+        self.text += chunk
+        text = self.text
+        items = []
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = text[self._string_start + 1:i]
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == '{' or ch == '[':
+                self._depth += 1
+                if ch == '[' and self._depth == 2 and self._last_string == "actions":
+                    self._in_actions = True
+                elif ch == '{' and self._depth == 3 and self._in_actions:
+                    self._item_start = i
+            elif ch == '}' or ch == ']':
+                if ch == '}' and self._depth == 3 and self._item_start is not None:
+                    try:
+                        items.append(json.loads(text[self._item_start:i + 1]))
+                    except json.JSONDecodeError as e:
+                        logger.debug(f"Skipping unparseable streamed action: {e}")
+                    self._item_start = None
+                elif ch == ']' and self._depth == 2:
+                    self._in_actions = False
+                self._depth -= 1
+        self._pos = len(text)
+        return items
+
+def _read_streamed_content(response, on_action):
+    """Collect the message content of a streamed (SSE) completion, passing each action to on_action once complete."""
+    parser = _ActionStreamParser()
+    parts = []
+    response.encoding = "utf-8"
+    for line in response.iter_lines(decode_unicode=True):
+        # Skip blank separators and keep-alive comments such as ': OPENROUTER PROCESSING'
+        if not line or not line.startswith("data: "):
+            continue
+        payload = line[len("data: "):]
+        if payload == "[DONE]":
+            break
+        chunk = json.loads(payload)
+        if "error" in chunk:
+            raise RuntimeError(f"OpenRouter stream error: {chunk['error']}")
+        delta = chunk["choices"][0].get("delta", {}).get("content")
+        if delta:
+            parts.append(delta)
+            for action in parser.feed(delta):
+                on_action(action)
+    return "".join(parts)
+
+def _post_with_retry(url, headers, data):
+    """POST a non-streamed request, retrying a response body that is cut off mid-transfer.
+    Connection errors and retryable statuses are already retried by the session's adapter."""
+    max_retries = 3
+    backoff = 0.5
+    for attempt in range(max_retries):
+        try:
+            response = _SESSION.post(url, headers=headers, json=data, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            return response
+        except (ChunkedEncodingError, urllib3.exceptions.ProtocolError) as e:
+            if attempt < max_retries - 1:
+                logger.warning(f"Network error: {type(e).__name__}: {e}. Retrying in {backoff:.2f} seconds...")
+                time.sleep(backoff)
+                # Jitter keeps parallel clients from retrying in lockstep
+                backoff = backoff * 2 + random.uniform(0, 0.25)
+            else:
+                logger.error(f"Max retries reached. Network failure: {type(e).__name__}: {e}")
+                raise
+
+def send_screenshot_to_llm(image_paths, state=None, analysis=None, plan=None, screen_resolution=None, history=None, memory=None, pinned_screenshot=None, latest_journal=None, on_action=None) -> dict:
+    """Send multiple screenshots and context to OpenRouter LLM and return the response as a dict.
+
+    If on_action is given the response is streamed, and each action is passed to on_action as soon as it has arrived.
+    """
     api_key = os.getenv("OPENROUTER_API_KEY")
     if not api_key:
         logger.error("OPENROUTER_API_KEY environment variable not set.")
@@ -34,25 +264,23 @@ def send_screenshot_to_llm(image_paths, state=None, analysis=None, plan=None, sc
     # Only keep the last 3 (plus pinned)
     image_paths = image_paths[-3:] if len(image_paths) > 3 else image_paths
 
-    # Prepare image data
-    images_content = []
-    for path in image_paths:
-        try:
-            with open(path, "rb") as img_file:
-                img_bytes = img_file.read()
-                img_b64 = base64.b64encode(img_bytes).decode("utf-8")
-                img_data_url = f"data:image/png;base64,{img_b64}"
-                images_content.append({"type": "image_url", "image_url": {"url": img_data_url}})
-        except Exception as e:
-            logger.warning(f"Failed to process screenshot {path}: {e}")
+    # Prepare image data in parallel (order is preserved); unchanged screenshots reuse their cached encoding
+    encoded = list(_ENCODE_POOL.map(_load_screenshot, image_paths))
+    images_content = [{"type": "image_url", "image_url": {"url": result[0]}} for result in encoded if result]
+    last_image_size = encoded[-1][1] if encoded and encoded[-1] else None
 
     # Auto-detect screen resolution from the most recent screenshot if not provided
     if screen_resolution is None and image_paths:
-        try:
-            with Image.open(image_paths[-1]) as img:
-                screen_resolution = {'width': img.width, 'height': img.height}
-        except Exception as e:
-            logger.warning(f"Failed to determine screen resolution: {e}")
+        if not last_image_size:
+            # The encode failed, but the PNG header alone is enough for the dimensions
+            try:
+                last_image_size = _read_png_size(image_paths[-1])
+            except OSError:
+                last_image_size = None
+        if last_image_size:
+            screen_resolution = {'width': last_image_size[0], 'height': last_image_size[1]}
+        else:
+            logger.warning(f"Failed to determine screen resolution from {image_paths[-1]}")
             screen_resolution = {'width': 0, 'height': 0}
 
     url = "https://openrouter.ai/api/v1/chat/completions"
@@ -60,86 +288,20 @@ def send_screenshot_to_llm(image_paths, state=None, analysis=None, plan=None, sc
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
-    # Generic, tool-agnostic context for the LLM
-    context = """
-You are an automation agent operating in a perception-action loop. Your job is to observe the environment, analyze the situation, plan, and act. You receive screenshots and context, and you must:
-- Provide a brief narrative of your intent and reasoning.
-- Propose a concise, step-by-step plan.
-- Output a list of timed actions to execute within the next 2 seconds (2000ms). Each action should specify type, parameters, and a start time offset in milliseconds.
-- Analyze the outcome after acting and describe the new state.
-
-You have access to a 'remember' tool. Use it to record important facts, discoveries, or strategies that should be retained for future context. When you want to remember something, add an entry to the journal with the key 'remember' and a short description of the fact or insight. These will be included in your system prompt as memory notes.
-
-Always use your journal to record relevant information, especially when you learn something new, encounter a novel situation, or need to track long-term goals or facts.
-
-You are provided with up to 5 prior screenshots (plus a pinned screenshot if present), recent plans, analyses, and memory notes from your journal.
-
-Screen resolution: {screen_resolution}
-Previous state: {state}
-Previous analysis: {analysis}
-Previous plan: {plan}
-Recent history (last 5): {history}
-Memory notes: {memory}
-""".format(
-        screen_resolution=json.dumps(screen_resolution),
-        state=json.dumps(state),
-        analysis=json.dumps(analysis),
-        plan=json.dumps(plan),
-        history=json.dumps(history),
-        memory=memory or ""
-    )
+    # Only this tail changes between calls; the preamble and schema are module constants
+    context_parts = [
+        _PROMPT_PREAMBLE,
+        "\nScreen resolution: ", json.dumps(screen_resolution),
+        "\nPrevious state: ", json.dumps(state),
+        "\nPrevious analysis: ", json.dumps(analysis),
+        "\nPrevious plan: ", json.dumps(plan),
+        "\nRecent history (last 5): ", json.dumps(history),
+        "\nMemory notes: ", memory or "", "\n",
+    ]
     if latest_journal:
-        context += f"\nLatest journal entry: {latest_journal}\n"
-    # --- BEGIN: WASD-style mouse control instructions ---
-    # For mouse actions, use these types:
-    # - mouse_move_direction: Move the mouse in a direction ('w', 'a', 's', 'd', 'up', 'down', 'left', 'right') for a specified duration (ms). Example:
-    #   {"type": "mouse_move_direction", "direction": "d", "duration_ms": 200, "time_offset_ms": 0}
-    # - mouse_click: Click at the current mouse position for a specified duration (ms). Example:
-    #   {"type": "mouse_click", "button": "left", "duration_ms": 100, "time_offset_ms": 100}
-    # - mouse_double_click: Double-click at the current mouse position for a specified duration (ms) per click. Example:
-    #   {"type": "mouse_double_click", "button": "left", "duration_ms": 100, "time_offset_ms": 200}
-    # Do not use absolute pixel coordinates for mouse actions unless explicitly required for legacy compatibility.
-    # --- END: WASD-style mouse control instructions ---
-    prompt = context + "\nRespond only with the JSON object as described above."
-    # Updated schema without planning_paths
-    schema = {
-        "type": "object",
-        "properties": {
-            "narrative": {"type": "string", "description": "Narrative plan for this loop."},
-            "plan": {"type": "string", "description": "Step-by-step plan for this loop."},
-            "actions": {
-                "type": "array",
-                "description": "Timed actions to execute within 2000ms.",
-                "items": {
-                    "type": "object",
-                    "properties": {
-                        "type": {
-                            "type": "string",
-                            "enum": ["key_press", "key_release", "mouse_move", "mouse_press", "mouse_release", "mouse_drag", "mouse_move_direction", "mouse_click", "mouse_double_click"],
-                            "description": "The type of input action."
-                        },
-                        "direction": {"type": "string", "description": "Direction for mouse_move_direction (w/a/s/d/up/down/left/right)."},
-                        "duration_ms": {"type": "integer", "description": "Duration in milliseconds for the action."},
-                        "button": {"type": "string", "enum": ["left", "right", "middle"], "description": "Mouse button for click actions."},
-                        "time_offset_ms": {"type": "integer", "description": "Start time in milliseconds relative to the beginning of the action sequence (0-2000)."},
-                        "key": {"type": "string", "description": "Key identifier (e.g., 'w', 'a', 'enter', 'shift'). Required for key actions."},
-                        "x": {"type": "integer", "description": "X coordinate. Required for mouse actions."},
-                        "y": {"type": "integer", "description": "Y coordinate. Required for mouse actions."},
-                        "duration_ms": {
-                            "type": "integer",
-                            "description": "Duration for holding a key or mouse button (used with key_press or mouse_press if release is not separate)."
-                        }
-                    },
-                    "required": ["type", "key", "x", "y", "button", "time_offset_ms", "duration_ms", "direction"],
-                    "additionalProperties": False
-                }
-            },
-            "analysis": {"type": "string", "description": "Analysis of the outcome and current state."},
-            "pinned_screenshot": {"type": ["string", "integer"], "description": "Filename or index of screenshot to pin.", "nullable": True}
-        },
-        "required": ["narrative", "plan", "actions", "analysis", "pinned_screenshot"],
-        "additionalProperties": False
-    }
+        context_parts += ["\nLatest journal entry: ", latest_journal, "\n"]
+    context_parts.append(_PROMPT_SUFFIX)
+    prompt = "".join(context_parts)
     data = {
         "model": config.LLM_MODEL,
         "messages": [
@@ -156,27 +318,20 @@ Memory notes: {memory}
             "json_schema": {
                 "name": "ooda_response_timed",
                 "strict": True,
-                "schema": schema
+                "schema": _RESPONSE_SCHEMA
             }
         }
     }
-    max_retries = 5
-    backoff = 1
-    for attempt in range(max_retries):
-        try:
-            response = requests.post(url, headers=headers, data=json.dumps(data))
-            response.raise_for_status()
-            break
-        except (ConnectionError, ChunkedEncodingError, urllib3.exceptions.ProtocolError) as e:
-            if attempt < max_retries - 1:
-                logger.warning(f"Network error: {type(e).__name__}: {e}. Retrying in {backoff} seconds...")
-                time.sleep(backoff)
-                backoff *= 2
-            else:
-                logger.error(f"Max retries reached. Network failure: {type(e).__name__}: {e}")
-                raise
-    result = response.json()
-    content = result["choices"][0]["message"]["content"]
+    if on_action is not None:
+        # A streamed body is read incrementally after the request returns, and its actions are dispatched
+        # as they arrive, so a cut-off stream is not retried: that would run the same actions again
+        data["stream"] = True
+        response = _SESSION.post(url, headers=headers, json=data, stream=True, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        content = _read_streamed_content(response, on_action)
+    else:
+        result = _post_with_retry(url, headers, data).json()
+        content = result["choices"][0]["message"]["content"]
     try:
         ooda_response = json.loads(content)
     except Exception as e:
@@ -184,4 +339,9 @@ Memory notes: {memory}
         logger.debug(f"Raw response content: {content}")
         ooda_response = {"narrative": "", "plan": "", "actions": [], "analysis": "Error parsing LLM response."}
 
-    return ooda_response
\ No newline at end of file
+    return ooda_response
+
+async def send_screenshot_to_llm_async(*args, **kwargs) -> dict:
+    """Run send_screenshot_to_llm on a worker thread so the event loop stays free while the request is in flight."""
+    async with _LLM_SLOT:
+        return await asyncio.to_thread(send_screenshot_to_llm, *args, **kwargs)
@@ -0,0 +1,34 @@
+"""
+logging_setup.py
+----------------
+Configures logging once for the whole process. Modules get their logger from get_logger instead of each calling basicConfig.
+"""
+import atexit
+import functools
+import logging
+import logging.handlers
+import queue
+
+LOG_FORMAT = '[%(asctime)s] [%(levelname)s] %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+@functools.lru_cache(maxsize=None)
+def configure():
+    """Install the default console handler. Runs once per process; later calls are no-ops."""
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, datefmt=DATE_FORMAT)
+
+def get_logger(name):
+    configure()
+    return logging.getLogger(name)
+
+@functools.lru_cache(maxsize=None)
+def start_queue_logging():
+    """Route all records through a queue drained by a listener thread, so callers never block on stderr."""
+    log_queue = queue.Queue()
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT))
+    # force=True replaces the console handler configure() may already have installed
+    logging.basicConfig(level=logging.INFO, handlers=[logging.handlers.QueueHandler(log_queue)], force=True)
+    listener = logging.handlers.QueueListener(log_queue, console_handler)
+    listener.start()
+    atexit.register(listener.stop)
@@ -0,0 +1,77 @@
+"""
+mac_cgevent.py
+--------------
+Minimal Quartz CGEvent helpers for posting keyboard/mouse events directly to the macOS HID event tap.
+"""
+import platform
+
+IS_MACOS = platform.system() == "Darwin"
+
+# Virtual key codes (ANSI layout) for pyautogui-style key names
+MAC_KEY_CODES = {
+    'a': 0x00, 's': 0x01, 'd': 0x02, 'f': 0x03, 'h': 0x04, 'g': 0x05, 'z': 0x06, 'x': 0x07,
+    'c': 0x08, 'v': 0x09, 'b': 0x0B, 'q': 0x0C, 'w': 0x0D, 'e': 0x0E, 'r': 0x0F, 'y': 0x10,
+    't': 0x11, '1': 0x12, '2': 0x13, '3': 0x14, '4': 0x15, '6': 0x16, '5': 0x17, '=': 0x18,
+    '9': 0x19, '7': 0x1A, '-': 0x1B, '8': 0x1C, '0': 0x1D, ']': 0x1E, 'o': 0x1F, 'u': 0x20,
+    '[': 0x21, 'i': 0x22, 'p': 0x23, 'l': 0x25, 'j': 0x26, "'": 0x27, 'k': 0x28, ';': 0x29,
+    '\\': 0x2A, ',': 0x2B, '/': 0x2C, 'n': 0x2D, 'm': 0x2E, '.': 0x2F, '`': 0x32,
+    'enter': 0x24, 'return': 0x24, '\n': 0x24, 'tab': 0x30, 'space': 0x31, ' ': 0x31,
+    'backspace': 0x33, 'esc': 0x35, 'escape': 0x35, 'command': 0x37, 'cmd': 0x37,
+    'shift': 0x38, 'shiftleft': 0x38, 'capslock': 0x39, 'alt': 0x3A, 'altleft': 0x3A, 'option': 0x3A,
+    'ctrl': 0x3B, 'ctrlleft': 0x3B, 'shiftright': 0x3C, 'altright': 0x3D, 'ctrlright': 0x3E,
+    'home': 0x73, 'pageup': 0x74, 'delete': 0x75, 'end': 0x77, 'pagedown': 0x79,
+    'left': 0x7B, 'right': 0x7C, 'down': 0x7D, 'up': 0x7E,
+    'f1': 0x7A, 'f2': 0x78, 'f3': 0x63, 'f4': 0x76, 'f5': 0x60, 'f6': 0x61,
+    'f7': 0x62, 'f8': 0x64, 'f9': 0x65, 'f10': 0x6D, 'f11': 0x67, 'f12': 0x6F,
+}
+MAC_KEY_CODES.update({f'num{i}': code for i, code in enumerate((0x52, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59, 0x5B, 0x5C))})
+
+# Characters typed with Shift on an ANSI layout; these are left to pyautogui, which presses Shift around them
+SHIFTED_CHARACTERS = frozenset('~!@#$%^&*()_+{}|:"<>?')
+
+def _quartz():
+    try:
+        import Quartz
+    except ImportError:
+        raise RuntimeError("Quartz is required on macOS for native input. Install with 'pip install pyobjc-framework-Quartz'.")
+    return Quartz
+
+def key_code(key):
+    """Return the macOS virtual key code for a pyautogui-style key name, or None if it can't be mapped or needs Shift."""
+    if not key or (len(key) == 1 and (key.isupper() or key in SHIFTED_CHARACTERS)):
+        return None
+    return MAC_KEY_CODES.get(key.lower())
+
+def post_key(key, up=False):
+    """Post a key down/up event. Returns False if the key has no key code."""
+    code = key_code(key)
+    if code is None:
+        return False
+    Quartz = _quartz()
+    event = Quartz.CGEventCreateKeyboardEvent(None, code, not up)
+    Quartz.CGEventPost(Quartz.kCGHIDEventTap, event)
+    return True
+
+def position():
+    """Return the current cursor position as integer (x, y)."""
+    Quartz = _quartz()
+    location = Quartz.CGEventGetLocation(Quartz.CGEventCreate(None))
+    return int(location.x), int(location.y)
+
+def post_mouse_move(x, y):
+    """Move the cursor to screen point (x, y)."""
+    Quartz = _quartz()
+    event = Quartz.CGEventCreateMouseEvent(None, Quartz.kCGEventMouseMoved, (x, y), Quartz.kCGMouseButtonLeft)
+    Quartz.CGEventPost(Quartz.kCGHIDEventTap, event)
+
+def post_mouse_button(button, x, y, up=False):
+    """Post a mouse button down/up event at screen point (x, y)."""
+    Quartz = _quartz()
+    event_types = {
+        'left': (Quartz.kCGEventLeftMouseDown, Quartz.kCGEventLeftMouseUp, Quartz.kCGMouseButtonLeft),
+        'right': (Quartz.kCGEventRightMouseDown, Quartz.kCGEventRightMouseUp, Quartz.kCGMouseButtonRight),
+        'middle': (Quartz.kCGEventOtherMouseDown, Quartz.kCGEventOtherMouseUp, Quartz.kCGMouseButtonCenter),
+    }
+    down_type, up_type, mouse_button = event_types[button]
+    event = Quartz.CGEventCreateMouseEvent(None, up_type if up else down_type, (x, y), mouse_button)
+    Quartz.CGEventPost(Quartz.kCGHIDEventTap, event)
@@ -1,16 +1,20 @@
 import logging
+import logging_setup
+import asyncio
+import atexit
 from screenshot import take_screenshot
-from llm_client import send_screenshot_to_llm
-from input_controller import execute_actions
+from llm_client import send_screenshot_to_llm_async
+from input_controller import submit_actions, submit_action_stream, FailSafeException
 import time
+import queue
+import sys
 import os
-import json  # Added for saving planning paths
-import io
-from PIL import Image
-import shutil  # Import for file copying
 import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import glob
 import config
+from response_cache import ResponseCache, dhash, context_key
 
 # ANSI color codes for OODA steps
 CYAN = '\033[96m'
@@ -19,14 +23,13 @@ GREEN = '\033[92m'
 MAGENTA = '\033[95m'
 RESET = '\033[0m'
 
+STARTUP_COUNTDOWN_SECONDS = 3
 WAIT_TIMEOUT_SECONDS = 10  # Increased timeout to allow more time for pygame signal
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='[%(asctime)s] [%(levelname)s] %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+# Set up logging. Records are handed to a queue and written to the console by a listener thread,
+# so the action dispatcher never blocks on stderr.
+logging_setup.start_queue_logging()
+logger = logging_setup.get_logger(__name__)
 
 def log(msg, level="INFO"):
     if level == "ERROR":
@@ -38,56 +41,189 @@ def log(msg, level="INFO"):
     else:
         logging.info(msg)
 
+# Synonyms and variants of action type names, keyed in lower case
+_ACTION_SYNONYMS = {
+    'press_key': 'key_press',
+    'release_key': 'key_release',
+    'keydown': 'key_press',
+    'keyup': 'key_release',
+    'mouse_down': 'mouse_press',
+    'mouse_up': 'mouse_release',
+    'drag': 'mouse_drag',
+    # Add more synonyms if needed
+}
+
 def normalize_action_type(action_type):
     """Map synonyms and variants to canonical action type names."""
-    mapping = {
-        'press_key': 'key_press',
-        'release_key': 'key_release',
-        'keydown': 'key_press',
-        'keyup': 'key_release',
-        'mouse_down': 'mouse_press',
-        'mouse_up': 'mouse_release',
-        'drag': 'mouse_drag',
-        # Add more synonyms if needed
-    }
     if not action_type:
         return None
     action_type = action_type.lower()
-    return mapping.get(action_type, action_type)
+    return _ACTION_SYNONYMS.get(action_type, action_type)
+
+def atomic_write(path, content):
+    """Write content to path via a temporary file and os.replace, so readers never see a partial file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+# Static part of the manual; only the title line depends on the game
+MANUAL_TEMPLATE = (
+    "# {game_title} Automation Manual\n"
+    "\n## Controls (Discovered)\n"
+    "- Mouse: Used for most UI interactions, selecting heroes, abilities, and targets.\n"
+    "- Keyboard: Common keys include arrow keys, D/right arrow for movement, 1-4 for skill selection, Enter/Space/Esc for confirmation or menu.\n"
+    "\n## Basic Gameplay (Discovered)\n"
+    "- Progression: Use mouse or keyboard to navigate menus, select campaign, and advance through tutorial.\n"
+    "- Combat: Select a hero, choose a skill (via mouse or number key), then click on an enemy to attack.\n"
+    "- Movement: Move mouse to right edge or use D/right arrow to advance along the road.\n"
+    "- Interactions: Click on objects (e.g., chests, torches) to interact.\n"
+    "- Tutorials: Pop-ups may block input; close with mouse click on 'X' or Esc.\n"
+    "\n## Persistent Discoveries\n"
+    "- Some actions require explicit skill selection before targeting.\n"
+    "- If input is unresponsive, check for overlays or pop-ups.\n"
+    "- Keyboard shortcuts (1-4) can select skills directly.\n"
+    "- Progress may require alternating between mouse and keyboard.\n"
+    "- If stuck, try Esc, Enter, or Space to dismiss overlays.\n"
+    "\n(Manual is regenerated at the start of each run. See run_summaries/ for detailed run logs.)\n"
+)
 
 def generate_manual(game_title):
     """Generate the persistent manual content for the given game title (controls, gameplay basics, discoveries)."""
+    config.ensure_dirs()
     manual_path = os.path.join(config.MANUALS_DIR, f"{game_title.replace(' ', '_')}_manual.md")
-    controls = (
-        f"# {game_title} Automation Manual\n"
-        "\n## Controls (Discovered)\n"
-        "- Mouse: Used for most UI interactions, selecting heroes, abilities, and targets.\n"
-        "- Keyboard: Common keys include arrow keys, D/right arrow for movement, 1-4 for skill selection, Enter/Space/Esc for confirmation or menu.\n"
-        "\n## Basic Gameplay (Discovered)\n"
-        "- Progression: Use mouse or keyboard to navigate menus, select campaign, and advance through tutorial.\n"
-        "- Combat: Select a hero, choose a skill (via mouse or number key), then click on an enemy to attack.\n"
-        "- Movement: Move mouse to right edge or use D/right arrow to advance along the road.\n"
-        "- Interactions: Click on objects (e.g., chests, torches) to interact.\n"
-        "- Tutorials: Pop-ups may block input; close with mouse click on 'X' or Esc.\n"
-        "\n## Persistent Discoveries\n"
-        "- Some actions require explicit skill selection before targeting.\n"
-        "- If input is unresponsive, check for overlays or pop-ups.\n"
-        "- Keyboard shortcuts (1-4) can select skills directly.\n"
-        "- Progress may require alternating between mouse and keyboard.\n"
-        "- If stuck, try Esc, Enter, or Space to dismiss overlays.\n"
-        "\n(Manual is regenerated at the start of each run. See run_summaries/ for detailed run logs.)\n"
-    )
-    with open(manual_path, 'w') as mf:
-        mf.write(controls)
+    controls = MANUAL_TEMPLATE.format(game_title=game_title)
+    # The manual is identical across runs, so skip the write when the file is already current
+    try:
+        with open(manual_path, 'r') as mf:
+            if mf.read() == controls:
+                return manual_path
+    except FileNotFoundError:
+        pass
+    atomic_write(manual_path, controls)
     return manual_path
 
-def main():
+def capture_screenshot(screenshot_path):
+    """Take a screenshot and validate it, retrying a few times before giving up. Returns the window size, or None."""
+    window_size = None
+    max_retries = 3
+    for attempt in range(max_retries):
+        try:
+            # take_screenshot validates the capture in memory before saving it
+            window_size = take_screenshot(screenshot_path)
+            break  # Valid screenshot, exit retry loop
+        except Exception as e:
+            log(f"Screenshot validation failed (attempt {attempt+1}/{max_retries}): {e}", "ERROR")
+            if attempt == max_retries - 1:
+                log(f"Could not produce a valid screenshot after {max_retries} attempts. Proceeding anyway.", "ERROR")
+            else:
+                time.sleep(0.2)  # Small delay before retry
+    log(f"Screenshot saved to {screenshot_path}", "OODA")
+    return window_size
+
+# Files the agent reads every loop but rarely changes, keyed by path -> (mtime_ns, contents)
+_file_cache = {}
+_journal_list_cache = {}  # journal dir -> (dir mtime_ns, journal paths newest first)
+
+def read_cached(path):
+    """Return the file's contents, re-reading it only when its mtime has changed."""
+    mtime_ns = os.stat(path).st_mtime_ns
+    cached = _file_cache.get(path)
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+    with open(path, 'r') as f:
+        data = f.read()
+    _file_cache[path] = (mtime_ns, data)
+    return data
+
+def list_journals(journal_dir):
+    """Return journal paths newest first, listing the directory only when a journal has been added or removed."""
+    mtime_ns = os.stat(journal_dir).st_mtime_ns
+    cached = _journal_list_cache.get(journal_dir)
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+    journal_files = sorted(glob.glob(os.path.join(journal_dir, "journal_*.md")), reverse=True)
+    _journal_list_cache[journal_dir] = (mtime_ns, journal_files)
+    return journal_files
+
+def read_context(journal_dir):
+    """Return (memory notes, latest journal entry) for the next LLM call."""
+    # Read memory file if exists
+    try:
+        memory_content = read_cached('memory.md')
+    except FileNotFoundError:
+        memory_content = ''
+    except Exception as e:
+        log(f"Failed to read memory.md: {e}", "ERROR")
+        memory_content = ''
+
+    # Only the newest journal is sent to the LLM
+    latest_journal_content = ""
+    journal_files = list_journals(journal_dir)
+    if journal_files:
+        try:
+            latest_journal_content = read_cached(journal_files[0])
+        except Exception as e:
+            log(f"Failed to read journal {journal_files[0]}: {e}", "ERROR")
+    return memory_content, latest_journal_content
+
+RUN_LOG_FLUSH_INTERVAL = 10  # Loops between flushes of the buffered run log, aligned with the journal cadence
+
+def save_records(loop_count, journal_dir, run_log, now_str, narrative, plan, analysis, actions):
+    """Write the periodic journal entry and append this iteration's summary to the buffered run log, both stamped now_str."""
+    # Every 10 loops, generate a journal entry
+    if loop_count % 10 == 0:
+        journal_text = f"# Journal Entry {now_str}\n\n"
+        journal_text += f"## Narrative\n{narrative}\n\n"
+        journal_text += f"## Plan\n{plan}\n\n"
+        journal_text += f"## Analysis\n{analysis}\n\n"
+        journal_text += f"## Actions\n{actions}\n\n"
+        if journal_text:
+            journal_filename = os.path.join(journal_dir, f"journal_{int(time.time())}.md")
+            try:
+                atomic_write(journal_filename, journal_text)
+                log(f"Saved new journal entry: {journal_filename}", "JOURNAL")
+            except Exception as e:
+                log(f"Failed to save journal entry: {e}", "ERROR")
+
+    # Append each run summary to this run's log; the buffer is flushed every few loops
+    try:
+        run_summary = (
+            f"# Run Summary {now_str}\n\n"
+            f"## Narrative\n{narrative}\n\n"
+            f"## Plan\n{plan}\n\n"
+            f"## Analysis\n{analysis}\n\n"
+            f"## Actions\n{actions}\n\n"
+        )
+        run_log.write(run_summary)
+        if loop_count % RUN_LOG_FLUSH_INTERVAL == 0:
+            run_log.flush()
+            log(f"Flushed run summaries to {run_log.name}", "RUN_SUMMARY")
+    except Exception as e:
+        log(f"Failed to save run summary: {e}", "ERROR")
+
+def _resolve_pinned_index(index, screenshot_history):
+    return screenshot_history[index] if 0 <= index < len(screenshot_history) else None
+
+def _resolve_pinned_name(name, screenshot_history):
+    if name in screenshot_history:
+        return name
+    return {os.path.basename(p): p for p in screenshot_history}.get(name)
+
+_PINNED_RESOLVERS = {int: _resolve_pinned_index, str: _resolve_pinned_name}
+
+def resolve_pinned(new_pinned, screenshot_history):
+    """Map the LLM's pinned_screenshot (an index, path or basename) to a path in screenshot_history, or None."""
+    resolver = _PINNED_RESOLVERS.get(type(new_pinned))
+    return resolver(new_pinned, screenshot_history) if resolver else None
+
+async def main():
     state = None  # Holds the last state/analysis
     analysis = None
     plan = None
     loop_count = 0
-    history = []  # Rolling history of last 5 states
-    screenshot_history = []  # Rolling list of last 5 screenshot paths
+    history = deque(maxlen=5)  # Rolling history of last 5 states
+    screenshot_history = deque(maxlen=5)  # Rolling list of last 5 screenshot paths
     pinned_screenshot = None
 
     JOURNAL_DIR = "journals"
@@ -98,51 +234,55 @@ def main():
     # Regenerate or load manual for the current game
     manual_path = generate_manual(config.GAME_TITLE)
 
-    # countdown for 3 seconds before starting
-    log(f"[OODA: OBSERVE] Starting in 3 seconds...", "OODA")
-    for i in range(3, 0, -1):
-        log(f"[OODA: OBSERVE] {i}...", "OODA")
-        time.sleep(1)
+    # Give an interactive user 3 seconds to focus the game; unattended runs start immediately
+    if sys.stdin.isatty() and not os.environ.get('OPERATOR_NO_COUNTDOWN'):
+        log(f"[OODA: OBSERVE] Starting in {STARTUP_COUNTDOWN_SECONDS} seconds...", "OODA")
+        await asyncio.sleep(STARTUP_COUNTDOWN_SECONDS)
     log(f"[OODA: OBSERVE] Starting now!", "OODA")
 
-    recent_journals = []
-    latest_journal_content = ""
+    response_cache = ResponseCache()
+    # One buffered run log per run instead of a new file every loop; closing it flushes the tail on exit
+    config.ensure_dirs()
+    run_log = open(os.path.join(config.RUN_SUMMARIES_DIR, f"run_{int(time.time())}.md"), 'w', buffering=1 << 16)
+    atexit.register(run_log.close)
+    # Record writes run off the loop on their own small pool; pending writes finish before the run log closes
+    write_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="record-writer")
+    atexit.register(write_pool.shutdown, wait=True)
+    pending_actions = None  # Future for the action sequence still running on the dispatcher thread
+    pending_records = None  # Task writing the previous iteration's journal/run summary
+    replayed_last = False  # Whether the previous iteration reused a cached response
 
     while True:
-        screenshot_path = f"screenshot_{int(time.time())}.png"
-        # Retry logic for screenshot validity
-        max_retries = 3
-        for attempt in range(max_retries):
+        # The records were written while the previous sequence ran; the context read below needs them on disk
+        if pending_records is not None:
+            await pending_records
+            pending_records = None
+        # Read memory/journals while the previous sequence is still being actuated
+        context_task = asyncio.create_task(asyncio.to_thread(read_context, JOURNAL_DIR))
+        # The screenshot must show the result of the previous actions, so only the capture waits for them
+        if pending_actions is not None:
             try:
-                take_screenshot(screenshot_path)
-                # Validate PNG
-                with open(screenshot_path, "rb") as f:
-                    img_bytes = f.read()
-                    img = Image.open(io.BytesIO(img_bytes))
-                    img.verify()  # Will raise if not a valid PNG
-                break  # Valid screenshot, exit retry loop
+                await asyncio.wrap_future(pending_actions)
+            except FailSafeException:
+                # The operator threw the cursor into a corner to stop the agent
+                raise
             except Exception as e:
-                log(f"Screenshot validation failed (attempt {attempt+1}/{max_retries}): {e}", "ERROR")
-                if attempt == max_retries - 1:
-                    log(f"Could not produce a valid screenshot after {max_retries} attempts. Proceeding anyway.", "ERROR")
-                else:
-                    time.sleep(0.2)  # Small delay before retry
-        log(f"Screenshot saved to {screenshot_path}", "OODA")
+                log(f"Action execution failed: {e}", "ERROR")
+            pending_actions = None
 
-        # Update screenshot history with the original paths (not the overlay versions)
-        screenshot_history.append(screenshot_path)
-        if len(screenshot_history) > 5:
-            screenshot_history = screenshot_history[-5:]
-
-        # Read memory file if exists
+        # One timestamp per iteration, shared by the journal entry and run summary
+        now_str = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        screenshot_path = f"screenshot_{int(time.time())}.jpg"
+        window_size = await asyncio.to_thread(capture_screenshot, screenshot_path)
+        memory_content, latest_journal_content = await context_task
         try:
-            with open('memory.md', 'r') as f:
-                memory_content = f.read()
-        except FileNotFoundError:
-            memory_content = ''
+            frame_hash = await asyncio.to_thread(dhash, screenshot_path)
         except Exception as e:
-            log(f"Failed to read memory.md: {e}", "ERROR")
-            memory_content = ''
+            log(f"Failed to hash screenshot {screenshot_path}: {e}", "WARNING")
+            frame_hash = None
+
+        # Update screenshot history with the original paths (not the overlay versions)
+        screenshot_history.append(screenshot_path)
 
         # Prepare rolling history (last 5 states)
         history.append({
@@ -150,98 +290,83 @@ def main():
             "plan": plan,
             "analysis": analysis
         })
-        if len(history) > 5:
-            history = history[-5:]
 
-        # Load recent journals for context
-        journal_files = sorted(glob.glob(os.path.join(JOURNAL_DIR, "journal_*.md")), reverse=True)
-        recent_journals = []
-        for jf in journal_files[:3]:
+        # A visually unchanged screen in the same context gets the same decision, without an API call.
+        # Never twice in a row: a replay sets the plan that keys the next lookup, so replayed actions that
+        # leave the screen unchanged would otherwise keep hitting the cache without ever asking the LLM.
+        cache_context = context_key(plan, memory_content)
+        cached_response = None
+        if frame_hash is not None and not replayed_last:
+            cached_response = response_cache.get(frame_hash, cache_context)
+        replayed_last = cached_response is not None
+        stream_future = None
+        streamed_actions = []
+        if cached_response is not None:
+            log("Screen unchanged since a cached response; skipping the LLM call", "OODA")
+            response = cached_response
+        else:
+            # Streamed actions are executed on the dispatcher thread while the rest of the response is still arriving
+            streamed_queue = queue.Queue()
+
+            def on_action(action):
+                streamed_actions.append(action)
+                streamed_queue.put(action)
+
+            stream_future = submit_action_stream(iter(streamed_queue.get, None))
+
+            # Send screenshots to LLM using the original screenshot paths
             try:
-                with open(jf, 'r') as f:
-                    recent_journals.append(f.read())
+                response = await send_screenshot_to_llm_async(
+                    list(screenshot_history),  # Use original screenshots for LLM
+                    state=state,
+                    analysis=analysis,
+                    plan=plan,
+                    # Screenshots are downscaled, so report the real window size for coordinates
+                    screen_resolution={'width': window_size[0], 'height': window_size[1]} if window_size else None,
+                    history=list(history),
+                    memory=memory_content,
+                    pinned_screenshot=pinned_screenshot,
+                    latest_journal=latest_journal_content,
+                    on_action=on_action
+                )
             except Exception as e:
-                log(f"Failed to read journal {jf}: {e}", "ERROR")
-        latest_journal_content = recent_journals[0] if recent_journals else ""
-
-        # Send screenshots to LLM using the original screenshot paths
-        try:
-            response = send_screenshot_to_llm(
-                screenshot_history,  # Use original screenshots for LLM
-                state=state,
-                analysis=analysis,
-                plan=plan,
-                history=history,
-                memory=memory_content,
-                pinned_screenshot=pinned_screenshot,
-                latest_journal=latest_journal_content
-            )
-        except Exception as e:
-            log(f"Exception during LLM call: {e}", "ERROR")
-            response = {"narrative": "", "plan": "", "actions": [], "analysis": f"Exception during LLM call: {e}"}
+                log(f"Exception during LLM call: {e}", "ERROR")
+                response = {"narrative": "", "plan": "", "actions": [], "analysis": f"Exception during LLM call: {e}"}
+            else:
+                # A parse failure comes back as a response with no actions; replaying it would stall the agent
+                if frame_hash is not None and response.get("actions"):
+                    await asyncio.to_thread(response_cache.put, frame_hash, cache_context, response)
+            finally:
+                streamed_queue.put(None)
         # Expecting response to have: 'narrative', 'plan', 'actions', 'analysis', (optional) 'pinned_screenshot'
         narrative = response.get("narrative", "")
         plan = response.get("plan", "")
         actions = response.get("actions", [])
         analysis = response.get("analysis", "")
         new_pinned = response.get("pinned_screenshot", None)
-        # If LLM returns a new pinned screenshot, update pinned_screenshot
+        # If LLM returns a new pinned screenshot (index, path or basename), update pinned_screenshot
         if new_pinned:
-            # If index, resolve to filename
-            if isinstance(new_pinned, int) and 0 <= new_pinned < len(screenshot_history):
-                pinned_screenshot = screenshot_history[new_pinned]
-            elif isinstance(new_pinned, str) and new_pinned in screenshot_history:
-                pinned_screenshot = new_pinned
-            else:
-                # If string but not in list, try to match by basename
-                for img in screenshot_history:
-                    if os.path.basename(img) == new_pinned:
-                        pinned_screenshot = img
-                        break
+            pinned_screenshot = resolve_pinned(new_pinned, screenshot_history) or pinned_screenshot
 
         log(f"Narrative: {narrative}", "OODA-ORIENT")
         log(f"Plan: {plan}", "OODA-ORIENT")
-        log(f"Actions: {actions}", "OODA-DECIDE")
+        # The full action list is recorded in the run log; only format it when debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            log(f"Actions: {actions}", "DEBUG")
         log(f"Analysis: {analysis}", "OODA-ORIENT")
 
-        # Execute actions
-        if actions:
-            execute_actions(actions)
-            log(f"Executed actions: {actions}", "OODA-ACT")
+        # Dispatch actions, unless they were already dispatched while the response streamed in.
+        # Actuation overlaps the record writes below and is awaited before the next screenshot.
+        pending_actions = stream_future
+        if actions and not streamed_actions:
+            pending_actions = submit_actions(actions)
+            log(f"Dispatched {len(actions)} actions", "OODA-ACT")
 
         loop_count += 1
 
-        # Every 10 loops, generate a journal entry
-        if loop_count % 10 == 0:
-            journal_text = f"# Journal Entry {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-            journal_text += f"## Narrative\n{narrative}\n\n"
-            journal_text += f"## Plan\n{plan}\n\n"
-            journal_text += f"## Analysis\n{analysis}\n\n"
-            journal_text += f"## Actions\n{actions}\n\n"
-            if journal_text:
-                journal_filename = os.path.join(JOURNAL_DIR, f"journal_{int(time.time())}.md")
-                try:
-                    with open(journal_filename, 'w') as jf:
-                        jf.write(journal_text)
-                    log(f"Saved new journal entry: {journal_filename}", "JOURNAL")
-                except Exception as e:
-                    log(f"Failed to save journal entry: {e}", "ERROR")
-
-        # Save each run summary as a timestamped file in run_summaries
-        try:
-            run_summary = (
-                f"# Run Summary {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                f"## Narrative\n{narrative}\n\n"
-                f"## Plan\n{plan}\n\n"
-                f"## Analysis\n{analysis}\n\n"
-                f"## Actions\n{actions}\n\n"
-            )
-            run_summary_filename = os.path.join(config.RUN_SUMMARIES_DIR, f"run_{int(time.time())}.md")
-            with open(run_summary_filename, 'w') as rsf:
-                rsf.write(run_summary)
-            log(f"Saved run summary: {run_summary_filename}", "RUN_SUMMARY")
-        except Exception as e:
-            log(f"Failed to save run summary: {e}", "ERROR")
+        pending_records = asyncio.get_running_loop().run_in_executor(
+            write_pool, save_records, loop_count, JOURNAL_DIR, run_log, now_str, narrative, plan, analysis, actions
+        )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
@@ -3,19 +3,29 @@ mouse_controller.py
 ------------------
 Provides WASD-style mouse movement and click/double-click actions.
 """
-import pyautogui
+import native_input
 import time
-import logging
+import timing
+import logging_setup
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = logging_setup.get_logger(__name__)
+
+def _ease_in_out_quad(t):
+    """Same curve as pyautogui.easeInOutQuad: accelerate through the first half, decelerate through the second."""
+    return 2 * t * t if t < 0.5 else -2 * t * t + 4 * t - 1
+
+def _click_native(x, y, down_ms, button):
+    """Press and release the button at (x, y) through the native backend (CGEvent / SendInput), holding it for down_ms."""
+    native_input.mouseDown(x=x, y=y, button=button)
+    timing.sleep_ms(down_ms)
+    native_input.mouseUp(x=x, y=y, button=button)
 
 class MouseController:
     def __init__(self, step_size=30):
         self.step_size = step_size  # Pixels per movement step
 
     def move(self, direction, duration_ms=100):
-        x, y = pyautogui.position()
+        x, y = native_input.position()
         dx, dy = 0, 0
         if direction in ('w', 'up'):
             dy = -self.step_size
@@ -26,27 +36,28 @@ class MouseController:
         elif direction in ('d', 'right'):
             dx = self.step_size
         else:
-            logger.warning(f"Unknown mouse move direction: {direction}")
+            logger.warning("Unknown mouse move direction: %s", direction)
             return
         steps = max(1, duration_ms // 20)
-        for _ in range(steps):
-            pyautogui.moveRel(dx / steps, dy / steps, duration=0)
-            time.sleep(duration_ms / steps / 1000.0)
-        logger.info(f"Mouse moved {direction} for {duration_ms}ms")
+        start = time.monotonic()
+        for i in range(1, steps + 1):
+            # Place each step on an eased path from the starting point: one absolute move per step,
+            # no cursor query, and no rounding error accumulating across relative moves
+            progress = _ease_in_out_quad(i / steps)
+            native_input.moveTo(round(x + dx * progress), round(y + dy * progress))
+            # Anchor each step to the start so per-step sleep error doesn't add up
+            timing.sleep_until(start + duration_ms * i / steps / 1000.0)
+        logger.debug("Mouse moved %s for %sms", direction, duration_ms)
 
     def click(self, duration_ms=100, button='left'):
-        x, y = pyautogui.position()
-        pyautogui.mouseDown(x=x, y=y, button=button)
-        time.sleep(duration_ms / 1000.0)
-        pyautogui.mouseUp(x=x, y=y, button=button)
-        logger.info(f"Mouse {button}-clicked at ({x},{y}) for {duration_ms}ms")
+        x, y = native_input.position()
+        _click_native(x, y, duration_ms, button)
+        logger.debug("Mouse %s-clicked at (%s,%s) for %sms", button, x, y, duration_ms)
 
     def double_click(self, duration_ms=100, button='left'):
-        x, y = pyautogui.position()
-        for i in range(2):
-            pyautogui.mouseDown(x=x, y=y, button=button)
-            time.sleep(duration_ms / 1000.0)
-            pyautogui.mouseUp(x=x, y=y, button=button)
-            if i == 0:
-                time.sleep(0.05)  # Short pause between clicks
-        logger.info(f"Mouse {button}-double-clicked at ({x},{y}) with {duration_ms}ms per click")
+        # One cursor query for both clicks, so the second lands exactly where the first did
+        x, y = native_input.position()
+        _click_native(x, y, duration_ms, button)
+        timing.sleep_ms(50)  # Short pause between clicks
+        _click_native(x, y, duration_ms, button)
+        logger.debug("Mouse %s-double-clicked at (%s,%s) with %sms per click", button, x, y, duration_ms)
@@ -0,0 +1,142 @@
+"""
+native_input.py
+---------------
+Dispatches key and mouse events to the lowest-latency backend available: SendInput on Windows,
+Quartz CGEvents on macOS, and pyautogui elsewhere. Mirrors the small pyautogui surface used by this project.
+"""
+import logging_setup
+import pyautogui
+import win_sendinput
+import mac_cgevent
+
+logger = logging_setup.get_logger(__name__)
+
+# pyautogui sleeps PAUSE seconds after every call by default; callers handle timing themselves
+pyautogui.PAUSE = 0
+pyautogui.MINIMUM_DURATION = 0
+pyautogui.MINIMUM_SLEEP = 0
+
+FailSafeException = pyautogui.FailSafeException
+_NATIVE = win_sendinput.IS_WINDOWS or mac_cgevent.IS_MACOS
+
+# Keys and mouse buttons currently held down through this module, so a reset only releases those
+_pressed_keys = set()
+_pressed_buttons = set()
+
+def _normalize_key(key):
+    return 'enter' if key == '\n' else key
+
+def _send_key(key, up):
+    if win_sendinput.IS_WINDOWS:
+        event = win_sendinput.key_event(key, up=up)
+        if event is not None:
+            win_sendinput.send([event])
+            return
+    elif mac_cgevent.IS_MACOS:
+        if mac_cgevent.post_key(key, up=up):
+            return
+    if up:
+        pyautogui.keyUp(key)
+    else:
+        pyautogui.keyDown(key)
+
+def _check_failsafe():
+    """Apply pyautogui's corner fail-safe, which the native backends would otherwise bypass. Releases are never blocked."""
+    if _NATIVE and pyautogui.FAILSAFE and tuple(position()) in pyautogui.FAILSAFE_POINTS:
+        raise FailSafeException(
+            "Fail-safe triggered from the mouse moving to a corner of the screen. "
+            "To disable this fail-safe, set pyautogui.FAILSAFE to False."
+        )
+
+def keyDown(key):
+    key = _normalize_key(key)
+    _check_failsafe()
+    _send_key(key, up=False)
+    _pressed_keys.add(key)
+
+def keyUp(key):
+    key = _normalize_key(key)
+    _send_key(key, up=True)
+    _pressed_keys.discard(key)
+
+def keyEvents(events):
+    """Send several (key, up) events back to back, as one SendInput call on Windows when every key maps."""
+    events = [(_normalize_key(key), up) for key, up in events]
+    if not all(up for _, up in events):
+        _check_failsafe()
+    inputs = [win_sendinput.key_event(key, up=up) for key, up in events] if win_sendinput.IS_WINDOWS else None
+    if inputs and all(inputs):
+        win_sendinput.send(inputs)
+    else:
+        for key, up in events:
+            _send_key(key, up)
+    for key, up in events:
+        if up:
+            _pressed_keys.discard(key)
+        else:
+            _pressed_keys.add(key)
+
+def position():
+    if win_sendinput.IS_WINDOWS:
+        return win_sendinput.cursor_position()
+    if mac_cgevent.IS_MACOS:
+        return mac_cgevent.position()
+    return tuple(pyautogui.position())
+
+def moveTo(x, y):
+    _check_failsafe()
+    if win_sendinput.IS_WINDOWS:
+        win_sendinput.send([win_sendinput.mouse_move_event(x, y)])
+    elif mac_cgevent.IS_MACOS:
+        mac_cgevent.post_mouse_move(x, y)
+    else:
+        pyautogui.moveTo(x, y)
+
+def _mouse_button(x, y, button, up):
+    if win_sendinput.IS_WINDOWS:
+        events = [win_sendinput.mouse_move_event(x, y)] if x is not None and y is not None else []
+        events.append(win_sendinput.mouse_button_event(button, up=up))
+        win_sendinput.send(events)
+    elif mac_cgevent.IS_MACOS:
+        if x is None or y is None:
+            x, y = mac_cgevent.position()
+        mac_cgevent.post_mouse_button(button, x, y, up=up)
+    elif up:
+        pyautogui.mouseUp(x=x, y=y, button=button)
+    else:
+        pyautogui.mouseDown(x=x, y=y, button=button)
+
+def mouseDown(x=None, y=None, button='left'):
+    _check_failsafe()
+    _mouse_button(x, y, button, up=False)
+    _pressed_buttons.add(button)
+
+def mouseUp(x=None, y=None, button='left'):
+    _mouse_button(x, y, button, up=True)
+    _pressed_buttons.discard(button)
+
+def releaseAll():
+    """Release every key and mouse button still held, in one SendInput call on Windows. Returns how many were released."""
+    keys = list(_pressed_keys)
+    buttons = list(_pressed_buttons)
+    _pressed_keys.clear()
+    _pressed_buttons.clear()
+    if not keys and not buttons:
+        return 0
+    if win_sendinput.IS_WINDOWS:
+        events = [win_sendinput.key_event(key, up=True) for key in keys]
+        events += [win_sendinput.mouse_button_event(button, up=True) for button in buttons]
+        if all(events):
+            win_sendinput.send(events)
+            return len(events)
+    for key in keys:
+        try:
+            _send_key(key, up=True)
+        except Exception as e:
+            logger.debug("Error releasing key %s: %s", key, e)
+    for button in buttons:
+        try:
+            _mouse_button(None, None, button, up=True)
+        except Exception as e:
+            logger.debug("Error releasing mouse button %s: %s", button, e)
+    return len(keys) + len(buttons)
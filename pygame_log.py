@@ -8,18 +8,15 @@ import pygame
 import sys
 import os
 from glob import glob
-import time
-from PIL import Image
-import logging
+import logging_setup
 
 WINDOW_SIZE = (800, 600)
 BG_COLOR = (30, 30, 30)
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = logging_setup.get_logger(__name__)
 
 def get_latest_screenshot():
-    screenshots = sorted(glob("screenshot_*.png"))
+    screenshots = sorted(glob("screenshot_*.jpg"))
     if screenshots:
         return screenshots[-1]
     return None
@@ -33,29 +30,33 @@ def main():
     running = True
     latest_img_surface = None
     latest_img_path = None
+    loaded_key = None  # (path, mtime_ns) of the image behind latest_img_surface
+    clock = pygame.time.Clock()
 
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
 
-        # Always show the latest screenshot
+        # Always show the latest screenshot, decoding and scaling it only when it changes
         latest_img_path = get_latest_screenshot()
         if latest_img_path:
             try:
-                img = Image.open(latest_img_path)
-                img_surface = pygame.image.load(latest_img_path)
-                img_surface = pygame.transform.scale(img_surface, WINDOW_SIZE)
-                latest_img_surface = img_surface
+                key = (latest_img_path, os.stat(latest_img_path).st_mtime_ns)
+                if key != loaded_key:
+                    img_surface = pygame.image.load(latest_img_path)
+                    latest_img_surface = pygame.transform.smoothscale(img_surface, WINDOW_SIZE)
+                    loaded_key = key
             except Exception as e:
                 logger.error(f"Failed to load screenshot {latest_img_path}: {e}")
                 latest_img_surface = None
+                loaded_key = None
 
         screen.fill(BG_COLOR)
         if latest_img_surface:
             screen.blit(latest_img_surface, (0, 0))
         pygame.display.flip()
-        time.sleep(0.05)
+        clock.tick(20)
 
     pygame.quit()
     logger.info("Pygame window closed.")
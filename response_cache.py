@@ -0,0 +1,90 @@
+"""
+response_cache.py
+-----------------
+Remembers LLM responses keyed by a perceptual hash of the screenshot plus the prompt context,
+so a visually unchanged screen can reuse the previous decision instead of making another API call.
+"""
+import collections
+import hashlib
+import logging_setup
+import os
+import pickle
+from PIL import Image
+import config
+
+logger = logging_setup.get_logger(__name__)
+
+HASH_SIZE = 8  # dHash grid; 8 gives a 64-bit hash
+MAX_HAMMING_DISTANCE = 4  # Frames this close are treated as visually identical
+MAX_ENTRIES = 128
+
+def dhash(path):
+    """Return the 64-bit difference hash of an image: one bit per horizontally adjacent pixel pair of a 9x8 grayscale thumbnail."""
+    with Image.open(path) as img:
+        pixels = list(img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR).getdata())
+    bits = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+def context_key(plan, memory):
+    """Stable digest of the prompt context a response depends on (str hash() is salted per process).
+    The game and model are included so uniform frames (loading or black screens) aren't shared between them."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (config.GAME_TITLE, config.LLM_MODEL):
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(str(plan).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update((memory or "")[:512].encode("utf-8"))
+    return digest.hexdigest()
+
+class ResponseCache:
+    """LRU of (frame hash, context key) -> response, persisted to disk so reuse carries across runs."""
+
+    def __init__(self, path=config.RESPONSE_CACHE_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._load()
+
+    def get(self, frame_hash, context):
+        """Return the most recent response with actions for this context whose frame is within MAX_HAMMING_DISTANCE, or None."""
+        for key in reversed(self._entries):
+            cached_hash, cached_context = key
+            if cached_context == context and (cached_hash ^ frame_hash).bit_count() <= MAX_HAMMING_DISTANCE:
+                response = self._entries[key]
+                # A response without actions would replay forever on a screen that only changes with input
+                if not response.get("actions"):
+                    continue
+                self._entries.move_to_end(key)
+                return response
+        return None
+
+    def put(self, frame_hash, context, response):
+        self._entries[(frame_hash, context)] = response
+        self._entries.move_to_end((frame_hash, context))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._save()
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                self._entries = collections.OrderedDict(pickle.load(f))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable response cache {self.path}: {e}")
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(list(self._entries.items()), f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Failed to save response cache {self.path}: {e}")
@@ -4,17 +4,18 @@ screenshot.py
 This module provides functions to capture screenshots of a specific window using platform-specific APIs.
 It includes robust error handling and logs issues for diagnostics.
 """
+import io
 from PIL import Image
 import pyautogui
 import sys
 import platform
-import logging
+import logging_setup
 import config
+from window_utils import WindowRectCache, WINDOW_CACHE_TTL_SECONDS
 
 WINDOW_TITLE = config.GAME_TITLE  # Use the game title from config
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = logging_setup.get_logger(__name__)
 
 def get_window_rect(title=WINDOW_TITLE):
     if platform.system() == "Darwin":
@@ -53,15 +54,89 @@ def get_window_rect(title=WINDOW_TITLE):
         win = windows[0]
         return win.left, win.top, win.width, win.height
 
+# Same expiry as the input side's cache; this rect includes the macOS title bar, so it is cached separately
+_window_cache = WindowRectCache(WINDOW_CACHE_TTL_SECONDS)
+
+def _cached_window_rect(title=WINDOW_TITLE):
+    cached = _window_cache.get(title)
+    if cached is None:
+        cached = get_window_rect(title), None
+        _window_cache.put(title, *cached)
+    return cached[0]
+
+MAX_SCREENSHOT_SIDE = 1024  # Vision models downscale internally; larger frames only add upload and token cost
+
+def _capture_jpeg_quartz(region, quality):
+    """Grab the screen region with CGWindowListCreateImage and encode it to JPEG in Quartz, with no Python-side pixel copy."""
+    try:
+        import objc
+        import Quartz
+    except ImportError:
+        raise RuntimeError("Quartz is required on macOS for screen capture. Install with 'pip install pyobjc-framework-Quartz'.")
+    left, top, width, height = region
+    with objc.autorelease_pool():
+        image = Quartz.CGWindowListCreateImage(
+            Quartz.CGRectMake(left, top, width, height),
+            Quartz.kCGWindowListOptionOnScreenOnly,
+            Quartz.kCGNullWindowID,
+            Quartz.kCGWindowImageDefault
+        )
+        if image is None:
+            raise RuntimeError("CGWindowListCreateImage returned no image; check the Screen Recording permission.")
+        data = Quartz.CFDataCreateMutable(None, 0)
+        destination = Quartz.CGImageDestinationCreateWithData(data, "public.jpeg", 1, None)
+        properties = {
+            Quartz.kCGImageDestinationLossyCompressionQuality: quality / 100.0,
+            # Also folds Retina captures (2x backing pixels) down to the upload size
+            Quartz.kCGImageDestinationImageMaxPixelSize: MAX_SCREENSHOT_SIDE,
+        }
+        Quartz.CGImageDestinationAddImage(destination, image, properties)
+        if not Quartz.CGImageDestinationFinalize(destination):
+            raise RuntimeError("Failed to encode the screen capture as JPEG.")
+        return bytes(data)
+
+def _capture_jpeg_pil(region, quality):
+    screenshot = pyautogui.screenshot(region=region)
+    # Validate the in-memory capture rather than re-reading the saved file
+    screenshot.load()
+    if screenshot.width == 0 or screenshot.height == 0:
+        raise ValueError(f"Empty screenshot for window region {region}")
+    screenshot.thumbnail((MAX_SCREENSHOT_SIDE, MAX_SCREENSHOT_SIDE), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    screenshot.convert("RGB").save(buffer, 'JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+def take_screenshot_bytes(quality: int = 70):
+    """
+    Capture the window as JPEG bytes downscaled to MAX_SCREENSHOT_SIDE, without touching disk.
+    Returns (jpeg_bytes, (window_width, window_height)).
+    """
+    try:
+        left, top, width, height = _cached_window_rect()
+        region = (left, top, width, height)
+        if platform.system() == "Darwin":
+            jpeg = _capture_jpeg_quartz(region, quality)
+        else:
+            jpeg = _capture_jpeg_pil(region, quality)
+        if not jpeg:
+            raise ValueError(f"Empty screenshot for window region {region}")
+        return jpeg, (width, height)
+    except Exception:
+        # The window may have moved or closed; look it up again on the next attempt
+        _window_cache.invalidate()
+        raise
+
 def take_screenshot(path: str, quality: int = 70):
     """
-    Take a screenshot of the window at full resolution and save as PNG. No scaling or compression is applied.
+    Take a screenshot of the window, downscale it to MAX_SCREENSHOT_SIDE and save it as JPEG.
+    Returns the window's (width, height), since the saved image may be smaller.
     """
     try:
-        left, top, width, height = get_window_rect()
-        screenshot = pyautogui.screenshot(region=(left, top, width, height))
-        screenshot.save(path, 'PNG')
+        jpeg, window_size = take_screenshot_bytes(quality)
+        with open(path, 'wb') as f:
+            f.write(jpeg)
         logger.info(f"Screenshot saved to {path}")
+        return window_size
     except Exception as e:
         logger.error(f"Failed to take screenshot: {e}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,28 @@
+"""
+timing.py
+---------
+High-resolution sleeps against absolute monotonic deadlines, with 1ms timer granularity on Windows.
+"""
+import atexit
+import ctypes
+import time
+import win_sendinput
+
+SPIN_SECONDS = 0.001  # Busy-wait this close to a deadline instead of trusting the OS scheduler
+
+if win_sendinput.IS_WINDOWS:
+    # The default Windows timer tick is 15.6ms, which rounds every short sleep up to the next tick
+    ctypes.windll.winmm.timeBeginPeriod(1)
+    atexit.register(ctypes.windll.winmm.timeEndPeriod, 1)
+
+def sleep_until(deadline):
+    """Block until the monotonic deadline, sleeping coarsely then spinning for the last millisecond."""
+    remaining = deadline - time.monotonic() - SPIN_SECONDS
+    if remaining > 0:
+        time.sleep(remaining)
+    while time.monotonic() < deadline:
+        pass
+
+def sleep_ms(duration_ms):
+    """Block for duration_ms milliseconds with sub-millisecond precision."""
+    sleep_until(time.monotonic() + duration_ms / 1000.0)
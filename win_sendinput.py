@@ -0,0 +1,143 @@
+"""
+win_sendinput.py
+----------------
+Minimal ctypes bindings for the Win32 SendInput API, used to send several keyboard/mouse events in a single call.
+"""
+import ctypes
+import ctypes.wintypes as wintypes
+import platform
+
+IS_WINDOWS = platform.system() == "Windows"
+
+INPUT_MOUSE = 0
+INPUT_KEYBOARD = 1
+
+KEYEVENTF_KEYUP = 0x0002
+
+MOUSEEVENTF_MOVE = 0x0001
+MOUSEEVENTF_LEFTDOWN = 0x0002
+MOUSEEVENTF_LEFTUP = 0x0004
+MOUSEEVENTF_RIGHTDOWN = 0x0008
+MOUSEEVENTF_RIGHTUP = 0x0010
+MOUSEEVENTF_MIDDLEDOWN = 0x0020
+MOUSEEVENTF_MIDDLEUP = 0x0040
+MOUSEEVENTF_VIRTUALDESK = 0x4000
+MOUSEEVENTF_ABSOLUTE = 0x8000
+
+SM_XVIRTUALSCREEN = 76
+SM_YVIRTUALSCREEN = 77
+SM_CXVIRTUALSCREEN = 78
+SM_CYVIRTUALSCREEN = 79
+
+# (down, up) flags per mouse button
+MOUSE_BUTTON_FLAGS = {
+    'left': (MOUSEEVENTF_LEFTDOWN, MOUSEEVENTF_LEFTUP),
+    'right': (MOUSEEVENTF_RIGHTDOWN, MOUSEEVENTF_RIGHTUP),
+    'middle': (MOUSEEVENTF_MIDDLEDOWN, MOUSEEVENTF_MIDDLEUP),
+}
+
+# Virtual-key codes for named keys; single characters are resolved with VkKeyScanW
+VK_CODES = {
+    'backspace': 0x08, 'tab': 0x09, 'enter': 0x0D, 'return': 0x0D, '\n': 0x0D,
+    'shift': 0x10, 'ctrl': 0x11, 'alt': 0x12, 'pause': 0x13, 'capslock': 0x14,
+    'esc': 0x1B, 'escape': 0x1B, 'space': 0x20, ' ': 0x20,
+    'pageup': 0x21, 'pagedown': 0x22, 'end': 0x23, 'home': 0x24,
+    'left': 0x25, 'up': 0x26, 'right': 0x27, 'down': 0x28,
+    'insert': 0x2D, 'delete': 0x2E,
+    'shiftleft': 0xA0, 'shiftright': 0xA1, 'ctrlleft': 0xA2, 'ctrlright': 0xA3,
+    'altleft': 0xA4, 'altright': 0xA5,
+}
+VK_CODES.update({f'f{i}': 0x6F + i for i in range(1, 13)})
+VK_CODES.update({f'num{i}': 0x60 + i for i in range(10)})
+
+ULONG_PTR = ctypes.c_size_t
+
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [
+        ("dx", wintypes.LONG),
+        ("dy", wintypes.LONG),
+        ("mouseData", wintypes.DWORD),
+        ("dwFlags", wintypes.DWORD),
+        ("time", wintypes.DWORD),
+        ("dwExtraInfo", ULONG_PTR),
+    ]
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [
+        ("wVk", wintypes.WORD),
+        ("wScan", wintypes.WORD),
+        ("dwFlags", wintypes.DWORD),
+        ("time", wintypes.DWORD),
+        ("dwExtraInfo", ULONG_PTR),
+    ]
+
+class HARDWAREINPUT(ctypes.Structure):
+    _fields_ = [
+        ("uMsg", wintypes.DWORD),
+        ("wParamL", wintypes.WORD),
+        ("wParamH", wintypes.WORD),
+    ]
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT), ("hi", HARDWAREINPUT)]
+
+class INPUT(ctypes.Structure):
+    _anonymous_ = ("u",)
+    _fields_ = [("type", wintypes.DWORD), ("u", _INPUTUNION)]
+
+def vk_code(key):
+    """
+    Return the virtual-key code for a pyautogui-style key name, or None if it can't be mapped.
+    Characters that need Shift (or another modifier) to type also return None, so the caller falls back
+    to pyautogui, which presses the modifier around the key.
+    """
+    vk = VK_CODES.get(key.lower()) if key else None
+    if vk is None and key and len(key) == 1 and IS_WINDOWS:
+        user32 = ctypes.windll.user32
+        user32.VkKeyScanW.restype = ctypes.c_short
+        scan = user32.VkKeyScanW(ord(key))
+        # The high byte is the modifier state the character needs: 1 = Shift, 2 = Ctrl, 4 = Alt
+        if scan == -1 or (scan >> 8) & 0xFF:
+            return None
+        vk = scan & 0xFF
+    return vk
+
+def key_event(key, up=False):
+    """Build a keyboard INPUT for the key, or None if the key has no virtual-key code."""
+    vk = vk_code(key)
+    if vk is None:
+        return None
+    return INPUT(type=INPUT_KEYBOARD, ki=KEYBDINPUT(wVk=vk, dwFlags=KEYEVENTF_KEYUP if up else 0))
+
+def mouse_button_event(button, up=False):
+    """Build a mouse button INPUT at the current cursor position."""
+    down_flag, up_flag = MOUSE_BUTTON_FLAGS[button]
+    return INPUT(type=INPUT_MOUSE, mi=MOUSEINPUT(dwFlags=up_flag if up else down_flag))
+
+def mouse_move_event(x, y):
+    """Build an absolute mouse move INPUT to screen pixel (x, y) anywhere on the virtual desktop (all monitors)."""
+    user32 = ctypes.windll.user32
+    left = user32.GetSystemMetrics(SM_XVIRTUALSCREEN)
+    top = user32.GetSystemMetrics(SM_YVIRTUALSCREEN)
+    width = user32.GetSystemMetrics(SM_CXVIRTUALSCREEN)
+    height = user32.GetSystemMetrics(SM_CYVIRTUALSCREEN)
+    # With VIRTUALDESK, absolute coordinates are normalized to 0..65535 across the bounding box of every
+    # monitor, whose origin can be negative when a monitor sits left of or above the primary one
+    dx = round((x - left) * 65535 / max(width - 1, 1))
+    dy = round((y - top) * 65535 / max(height - 1, 1))
+    flags = MOUSEEVENTF_MOVE | MOUSEEVENTF_ABSOLUTE | MOUSEEVENTF_VIRTUALDESK
+    return INPUT(type=INPUT_MOUSE, mi=MOUSEINPUT(dx=dx, dy=dy, dwFlags=flags))
+
+def cursor_position():
+    """Return the current cursor position as (x, y)."""
+    point = wintypes.POINT()
+    ctypes.windll.user32.GetCursorPos(ctypes.byref(point))
+    return point.x, point.y
+
+def send(events):
+    """Send all events with one SendInput call. Returns the number of events the OS accepted."""
+    events = list(events)
+    if not events:
+        return 0
+    array = (INPUT * len(events))(*events)
+    return ctypes.windll.user32.SendInput(len(events), array, ctypes.sizeof(INPUT))
@@ -4,40 +4,66 @@ window_utils.py
 Provides cross-platform window finding and activation utilities.
 """
 import platform
+import time
 import config
-import logging
+import logging_setup
 
 WINDOW_TITLE = config.GAME_TITLE
+WINDOW_CACHE_TTL_SECONDS = 0.5  # Game windows rarely move; re-query at most this often
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = logging_setup.get_logger(__name__)
 
-def get_window_rect(title=WINDOW_TITLE):
+class WindowRectCache:
+    """Remembers recent window lookups per title for a short TTL."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}  # title -> (looked_up_at, rect, owner)
+
+    def get(self, title):
+        entry = self._entries.get(title)
+        if entry and time.monotonic() - entry[0] < self.ttl:
+            return entry[1], entry[2]
+        return None
+
+    def put(self, title, rect, owner):
+        self._entries[title] = (time.monotonic(), rect, owner)
+
+    def invalidate(self, title=None):
+        if title is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(title, None)
+
+_window_cache = WindowRectCache(WINDOW_CACHE_TTL_SECONDS)
+
+def _find_window(title):
+    """Look up the window and return ((left, top, width, height), owner): the owning PID on macOS, the window elsewhere."""
     if platform.system() == "Darwin":
         try:
+            import objc
             import Quartz
-            import subprocess
-            options = Quartz.kCGWindowListOptionOnScreenOnly | Quartz.kCGWindowListExcludeDesktopElements
-            windowList = Quartz.CGWindowListCopyWindowInfo(options, Quartz.kCGNullWindowID)
-            for window in windowList:
-                if title.lower() in window.get('kCGWindowName', '').lower():
-                    bounds = window['kCGWindowBounds']
-                    left = int(bounds['X'])
-                    top = int(bounds['Y'])
-                    width = int(bounds['Width'])
-                    height = int(bounds['Height'])
-                    # Adjust for macOS title bar (commonly 22px)
-                    TITLE_BAR_HEIGHT = 22
-                    top += TITLE_BAR_HEIGHT
-                    height -= TITLE_BAR_HEIGHT
-                    # Activate window using AppleScript
-                    app_name = window.get('kCGWindowOwnerName', None)
-                    if app_name:
-                        subprocess.run([
-                            'osascript', '-e', f'tell application "{app_name}" to activate'
-                        ], check=False)
-                    return left, top, width, height
-            raise RuntimeError(f"Window '{title}' not found. Available windows: {[w.get('kCGWindowName', '') for w in windowList]}")
+            # Drain the NSString/NSDictionary proxies created while walking the window list; without
+            # a pool they are never released inside a long-running Python loop
+            with objc.autorelease_pool():
+                options = Quartz.kCGWindowListOptionOnScreenOnly | Quartz.kCGWindowListExcludeDesktopElements
+                windowList = Quartz.CGWindowListCopyWindowInfo(options, Quartz.kCGNullWindowID)
+                for window in windowList:
+                    if title.lower() in window.get('kCGWindowName', '').lower():
+                        bounds = window['kCGWindowBounds']
+                        left = int(bounds['X'])
+                        top = int(bounds['Y'])
+                        width = int(bounds['Width'])
+                        height = int(bounds['Height'])
+                        # Adjust for macOS title bar (commonly 22px)
+                        TITLE_BAR_HEIGHT = 22
+                        top += TITLE_BAR_HEIGHT
+                        height -= TITLE_BAR_HEIGHT
+                        # Return the owning PID as a plain int so no Objective-C proxy outlives the pool
+                        owner_pid = window.get('kCGWindowOwnerPID', None)
+                        return (left, top, width, height), int(owner_pid) if owner_pid is not None else None
+                available = [str(w.get('kCGWindowName', '')) for w in windowList]
+            raise RuntimeError(f"Window '{title}' not found. Available windows: {available}")
         except ImportError:
             raise RuntimeError("Quartz is required on macOS for window geometry. Install with 'pip install pyobjc-framework-Quartz'.")
     else:
@@ -48,5 +74,38 @@ def get_window_rect(title=WINDOW_TITLE):
         if not windows:
             raise RuntimeError(f"Window '{title}' not found. Available windows: {gw.getAllTitles()}")
         win = windows[0]
-        win.activate()  # Bring window to front
-        return win.left, win.top, win.width, win.height
+        return (win.left, win.top, win.width, win.height), win
+
+def _lookup(title):
+    cached = _window_cache.get(title)
+    if cached is None:
+        cached = _find_window(title)
+        _window_cache.put(title, *cached)
+    return cached
+
+def get_window_rect(title=WINDOW_TITLE):
+    """Return (left, top, width, height) of the window, cached for WINDOW_CACHE_TTL_SECONDS."""
+    return _lookup(title)[0]
+
+def activate_window(title=WINDOW_TITLE):
+    """Bring the window to the front, skipping the work when it is already frontmost."""
+    owner = _lookup(title)[1]
+    if platform.system() == "Darwin":
+        if owner is None:
+            return
+        try:
+            import objc
+            import AppKit
+        except ImportError:
+            raise RuntimeError("AppKit is required on macOS for window activation. Install with 'pip install pyobjc-framework-Cocoa'.")
+        # Activate in-process through NSRunningApplication instead of spawning osascript
+        with objc.autorelease_pool():
+            frontmost = AppKit.NSWorkspace.sharedWorkspace().frontmostApplication()
+            if frontmost is not None and frontmost.processIdentifier() == owner:
+                return
+            app = AppKit.NSRunningApplication.runningApplicationWithProcessIdentifier_(owner)
+            if app is not None:
+                app.activateWithOptions_(AppKit.NSApplicationActivateIgnoringOtherApps)
+    else:
+        if not owner.isActive:
+            owner.activate()  # Bring window to front